@@ -0,0 +1,4 @@
+# ==============================================================================
+# BENCHMARKS: ข้อมูลสังเคราะห์ + Google Sheets จำลองในหน่วยความจำ (ไม่ต้องต่อเน็ต)
+#   python -m bench --rooms 3 --groups 30 --events 300 --latency 0.05 --out bench.json
+# ==============================================================================
@@ -0,0 +1,40 @@
+import argparse
+import json
+import platform
+import sys
+from datetime import datetime
+
+import pandas as pd
+
+from .scenarios import SCENARIOS, Env, run
+
+def main(argv=None):
+    p = argparse.ArgumentParser(prog="python -m bench", description="วัดเวลา/หน่วยความจำของงานหลักด้วยข้อมูลสังเคราะห์")
+    p.add_argument("--rooms", type=int, default=3)
+    p.add_argument("--groups", type=int, default=30, help="กลุ่มต่อห้อง")
+    p.add_argument("--events", type=int, default=200, help="event ต่อกลุ่ม")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--latency", type=float, default=0.0, help="วินาทีต่อการเรียก Sheets API หนึ่งครั้ง")
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), help="ค่าเริ่มต้น: ทั้งหมด")
+    p.add_argument("--out", help="ไฟล์ JSON (ไม่ระบุ = พิมพ์ออก stdout)")
+    args = p.parse_args(argv)
+
+    env = Env(args.rooms, args.groups, args.events, args.seed, args.latency)
+    report = {
+        "meta": {
+            "params": {k: v for k, v in vars(args).items() if k != "out"},
+            "python": platform.python_version(), "pandas": pd.__version__,
+            "platform": platform.platform(), "timestamp": datetime.now().isoformat(timespec="seconds"),
+        },
+        "results": run(env, args.scenarios, args.repeat),
+        "api_calls": env.conn.calls,
+        "cells": {"read": env.conn.cells_read, "written": env.conn.cells_written},
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f: f.write(text + "\n")
+    else: sys.stdout.write(text + "\n")
+
+if __name__ == "__main__":
+    main()
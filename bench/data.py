@@ -0,0 +1,44 @@
+# ==============================================================================
+# SYNTHETIC DATA: ห้อง × กลุ่ม × event ต่อกลุ่ม (seed เดียวกันได้ข้อมูลเดิมทุกครั้ง)
+# ==============================================================================
+import json
+import random
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from gamification import BadgeEngine
+from storage import COLS, LEDGER_COLS
+
+AWARDS = (100, 20, 100, -100, 15, 5, -20) # ปุ่มด่วน + คะแนนกำหนดเอง
+START = datetime(2025, 5, 1, 8, 0)
+
+def room_name(i):
+    return f"ม.{i // 10 + 1}/{i % 10 + 1}"
+
+def generate(rooms=3, groups=30, events=200, seed=0):
+    """(Sheet1, Ledger) แบบเดียวกับในชีตจริง: XP/Badges ของ Sheet1 ตรงกับ Ledger"""
+    rng = random.Random(seed)
+    led = []
+    for r in range(rooms):
+        for g in range(groups):
+            ts = START
+            for _ in range(events):
+                ts += timedelta(minutes=rng.randint(1, 600))
+                led.append((f"{rng.getrandbits(32):08x}", room_name(r), f"G{g + 1:02d}",
+                            ts.strftime("%Y-%m-%d %H:%M:%S"), "bench", rng.choice(AWARDS)))
+    led = pd.DataFrame(led, columns=LEDGER_COLS).sort_values('Ts', kind='stable').reset_index(drop=True)
+
+    stats = BadgeEngine.stats_from_events(led)
+    badges = BadgeEngine().evaluate_frame(stats)
+    keys = [(room_name(r), f"G{g + 1:02d}") for r in range(rooms) for g in range(groups)]
+    sheet = pd.DataFrame({
+        'Room': [k[0] for k in keys],
+        'GroupName': [k[1] for k in keys],
+        'XP': [int(stats.loc[k, 'balance']) if k in stats.index else 0 for k in keys],
+        'Members': [", ".join(f"นักเรียน {rng.randint(1, 45)}" for _ in range(4)) for _ in keys],
+        'LastUpdated': START.strftime("%Y-%m-%d %H:%M"),
+        'Badges': [json.dumps(badges.get(k, []), ensure_ascii=False) for k in keys],
+        'Rev': 0,
+    }, columns=COLS)
+    return sheet, led
@@ -0,0 +1,105 @@
+# ==============================================================================
+# FAKE GSHEETS: แทน GSheetsConnection (read/update/create + worksheet ของ gspread)
+# เก็บชีตเป็น list ของแถวในหน่วยความจำ ทุกการเรียก API หน่วงเวลา latency วินาที
+# ==============================================================================
+import re
+import time
+
+import pandas as pd
+from gspread.exceptions import WorksheetNotFound
+
+class FakeSpreadsheet:
+    def __init__(self, book):
+        self.book = book
+
+    def batch_update(self, body):
+        self.book._call('batch_update')
+        # deleteDimension ส่งมาเรียงจากล่างขึ้นบนอยู่แล้ว
+        for req in body['requests']:
+            rng = req['deleteDimension']['range']
+            del self.book.grid[self.book.names[rng['sheetId']]][rng['startIndex']:rng['endIndex']]
+
+class FakeWorksheet:
+    """ส่วนของ gspread.Worksheet ที่ storage ใช้"""
+    def __init__(self, book, name):
+        self.book, self.name = book, name
+        self.id = book.ids.setdefault(name, len(book.ids))
+        book.names[self.id] = name
+        self.spreadsheet = FakeSpreadsheet(book)
+
+    @property
+    def rows(self):
+        return self.book.grid[self.name]
+
+    @staticmethod
+    def _row(a1):
+        return int(re.match(r"[A-Z]+(\d+)", a1).group(1))
+
+    def batch_get(self, ranges, value_render_option=None, **kw):
+        self.book._call('batch_get')
+        out = [[list(self.rows[r - 1])] if r - 1 < len(self.rows) else [] for r in map(self._row, ranges)]
+        self.book.cells_read += sum(len(v[0]) for v in out if v)
+        return out
+
+    def batch_update(self, data, value_input_option=None, **kw):
+        self.book._call('batch_update')
+        for d in data:
+            r = self._row(d['range'])
+            while len(self.rows) < r: self.rows.append([""] * len(self.rows[0]))
+            self.rows[r - 1] = list(d['values'][0])
+            self.book.cells_written += len(d['values'][0])
+
+    def append_rows(self, values, value_input_option=None, table_range=None, **kw):
+        self.book._call('append_rows')
+        self.rows.extend(list(v) for v in values)
+        self.book.cells_written += sum(len(v) for v in values)
+
+class FakeClient:
+    def __init__(self, book):
+        self.book = book
+
+    def _select_worksheet(self, worksheet=None, **kw):
+        if worksheet not in self.book.grid: raise WorksheetNotFound(worksheet)
+        return FakeWorksheet(self.book, worksheet)
+
+class FakeSheets:
+    """ใช้แทน st.connection("gsheets", ...) ได้ทันที: SheetsStore(conn=FakeSheets(...))"""
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.grid = {} # worksheet -> แถว (แถวแรกเป็นหัวตาราง)
+        self.ids, self.names = {}, {}
+        self.client = FakeClient(self)
+        self.calls = {}
+        self.cells_read = self.cells_written = 0
+
+    def _call(self, op):
+        self.calls[op] = self.calls.get(op, 0) + 1
+        if self.latency: time.sleep(self.latency)
+
+    def load(self, worksheet, df):
+        self.grid[worksheet] = [list(df.columns)] + [["" if pd.isna(v) else v for v in row] for row in df.itertuples(index=False)]
+
+    def read(self, worksheet="Sheet1", ttl=None, **kw):
+        self._call('read')
+        if worksheet not in self.grid: raise WorksheetNotFound(worksheet)
+        head, *rows = self.grid[worksheet]
+        self.cells_read += len(head) * len(rows)
+        df = pd.DataFrame(rows, columns=head)
+        # ชีตจริงคืนตัวเลขเป็นตัวเลข
+        for c in df.columns:
+            num = pd.to_numeric(df[c], errors='coerce')
+            if len(df) and num.notna().all(): df[c] = num
+        return df
+
+    def update(self, worksheet="Sheet1", data=None, **kw):
+        if worksheet not in self.grid: raise WorksheetNotFound(worksheet)
+        return self._write(worksheet, data)
+
+    def create(self, worksheet=None, data=None, **kw):
+        return self._write(worksheet, data)
+
+    def _write(self, worksheet, data):
+        self._call('update')
+        self.load(worksheet, data)
+        self.cells_written += data.size
+        return data
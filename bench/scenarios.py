@@ -0,0 +1,112 @@
+# ==============================================================================
+# SCENARIOS: แต่ละ scenario เตรียมข้อมูลแล้วคืนฟังก์ชันไม่มีอาร์กิวเมนต์ที่จะถูกจับเวลา
+# ==============================================================================
+import statistics
+import time
+import tracemalloc
+
+import leaderboard_image
+from gamification import RankSystem, BadgeEngine
+from storage import SheetsStore, RoomModel, LEDGER, SHEET
+
+from .data import generate, room_name
+from .fake_gsheets import FakeSheets
+
+SCENARIOS = {}
+
+def scenario(name):
+    def deco(fn):
+        SCENARIOS[name] = fn
+        return fn
+    return deco
+
+class Env:
+    """ชีตจำลอง + SheetsStore ที่โหลด snapshot แล้ว (ใช้ร่วมกันทุก scenario)"""
+    def __init__(self, rooms, groups, events, seed=0, latency=0.0):
+        self.sheet, self.ledger = generate(rooms, groups, events, seed)
+        self.conn = FakeSheets(latency)
+        self.conn.load(SHEET, self.sheet)
+        self.conn.load(LEDGER, self.ledger)
+        self.db = SheetsStore(conn=self.conn)
+        self.db.fetch()
+        self.room = room_name(0)
+        self.group = self.sheet['GroupName'].iloc[0]
+        self.rs, self.be = RankSystem.load(), BadgeEngine()
+
+    def room_df(self):
+        df = self.db.fetch()
+        return df[df['Room'] == self.room]
+
+def measure(op, repeat=5):
+    """เวลา (ms) จาก perf_counter หลายรอบ + หน่วยความจำสูงสุดจากรอบแยกที่เปิด tracemalloc"""
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        op()
+        times.append((time.perf_counter() - t) * 1000)
+    # tracemalloc ทำให้ช้าลงมาก จึงไม่ปนกับรอบจับเวลา
+    tracemalloc.start()
+    try:
+        op()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"median_ms": round(statistics.median(times), 3), "min_ms": round(min(times), 3),
+            "max_ms": round(max(times), 3), "peak_kib": round(peak / 1024, 1), "repeat": repeat}
+
+@scenario("fetch_cold")
+def fetch_cold(env):
+    def op():
+        env.db.cache.df = None # บังคับอ่าน Sheet1 + Ledger ใหม่ทั้งหมด
+        env.db.fetch()
+    return op
+
+@scenario("fetch_warm")
+def fetch_warm(env):
+    return env.db.fetch
+
+@scenario("update_score")
+def update_score(env):
+    # เฉพาะส่วนที่ผู้ใช้รอ (แก้ snapshot + เข้าคิว) การเขียนชีตอยู่ใน write_behind_flush
+    return lambda: env.db.update_score(env.room, [env.group], 5, "bench", env.be)
+
+@scenario("write_behind_flush")
+def write_behind_flush(env):
+    def op():
+        env.db.update_score(env.room, [env.group], 5, "bench", env.be)
+        env.db.writer.drain()
+    return op
+
+@scenario("power_edit")
+def power_edit(env):
+    hist = env.db.history(env.room, env.group)
+    return lambda: env.db.power_edit(env.room, env.group, hist, env.be)
+
+@scenario("generate_image")
+def generate_image(env):
+    df = env.room_df()
+    def op():
+        # ล้างแคชฟอนต์/tile ให้เหมือนวาดครั้งแรกหลังเปิดเซิร์ฟเวอร์
+        for fn in (leaderboard_image.load_font, leaderboard_image.fit_font_size, leaderboard_image._header_tile,
+                   leaderboard_image._card_mask, leaderboard_image._packed_tile):
+            if hasattr(fn, 'cache_clear'): fn.cache_clear()
+        leaderboard_image.generate_image(env.room, df, env.rs)
+    return op
+
+@scenario("room_model")
+def room_model(env):
+    df, ev = env.room_df(), env.db.events(env.room).iloc[::-1]
+    return lambda: RoomModel(env.room, df, ev, env.db.badges(env.room, env.be)).timeline() # เท่ากับที่ Analytics ต้องแปลงเมื่อข้อมูลเปลี่ยน
+
+@scenario("ranks")
+def ranks(env):
+    xp = env.db.fetch()['XP']
+    return lambda: (env.rs.ranks_for(xp), env.rs.progress_for(xp))
+
+@scenario("badges")
+def badges(env):
+    ev = env.db.events(None).sort_values('Ts', kind='stable')
+    return lambda: env.be.evaluate_frame(BadgeEngine.stats_from_events(ev))
+
+def run(env, names=None, repeat=5):
+    return {name: measure(SCENARIOS[name](env), repeat) for name in (names or SCENARIOS)}
@@ -0,0 +1,74 @@
+# ==============================================================================
+# EVOLUTION RACE CHART (ลดจำนวนจุดฝั่ง server ก่อนส่งให้ Altair)
+# ==============================================================================
+import os
+
+import numpy as np
+
+import perf
+
+# จำนวนจุดสูงสุดที่ส่งไปวาดกราฟ (รวมทุกกลุ่ม) ตั้งได้ด้วย env CHART_POINT_BUDGET
+CHART_POINT_BUDGET = int(os.environ.get("CHART_POINT_BUDGET", "1500"))
+MIN_GROUP_POINTS = 3 # อย่างน้อยจุดแรก จุดกลาง จุดสุดท้าย
+
+def lttb(x, y, n):
+    """Largest-Triangle-Three-Buckets: index ของจุดที่เก็บไว้ n จุด (เก็บจุดแรก/สุดท้ายเสมอ)
+
+    x ต้องเรียงน้อยไปมาก แต่ละ bucket เลือกจุดที่ทำสามเหลี่ยมใหญ่สุดกับจุดที่เลือกก่อนหน้า
+    และค่าเฉลี่ยของ bucket ถัดไป รูปทรงของเส้น (จุดขึ้นลงแรง ๆ) จึงยังอยู่
+    """
+    size = len(x)
+    if n >= size or n < MIN_GROUP_POINTS: return np.arange(size)
+    every = (size - 2) / (n - 2)
+    # ขอบของ bucket ที่ i: [edges[i], edges[i+1]) ไม่นับจุดแรก/สุดท้าย
+    edges = np.minimum((np.arange(n - 1) * every).astype(int) + 1, size - 1)
+    edges[-1] = size - 1
+    out = np.empty(n, dtype=int)
+    out[0], out[-1] = 0, size - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nlo, nhi = hi, (edges[i + 2] if i + 2 < n - 1 else size)
+        avg_x, avg_y = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        out[i + 1] = a
+    return out
+
+@perf.timed("chart_downsample")
+def downsample(hist_df, budget=CHART_POINT_BUDGET):
+    """เหลือไม่เกิน ~budget จุด แบ่งโควตาให้แต่ละกลุ่มตามจำนวน event (กลุ่มเล็กได้ครบทุกจุด)
+
+    hist_df คือ Store.timeline() (เรียงตามเวลา) จุดที่เหลือเป็น event จริง tooltip จึงยังถูกต้อง
+    """
+    if len(hist_df) <= budget: return hist_df
+    groups = hist_df.groupby('Group', sort=False).indices
+    quota = {g: max(MIN_GROUP_POINTS, int(budget * len(ix) / len(hist_df))) for g, ix in groups.items()}
+    x = hist_df['Timestamp'].to_numpy().astype('datetime64[s]').astype(float)
+    y = hist_df['Score'].to_numpy(dtype=float)
+    keep = [ix[lttb(x[ix], y[ix], quota[g])] for g, ix in groups.items()]
+    return hist_df.iloc[np.sort(np.concatenate(keep))]
+
+@perf.timed("chart_build")
+def race_chart(hist_df):
+    """กราฟเส้น Multi-line Chart เปรียบเทียบคะแนนสะสมของทุกกลุ่มตามเวลา"""
+    import altair as alt
+    return alt.Chart(hist_df).mark_line(point=True).encode(
+        # แกน X เป็นเวลา
+        x=alt.X('Timestamp', title='เวลาที่บันทึก', axis=alt.Axis(format='%d/%m %H:%M')),
+        # แกน Y เป็นคะแนนสะสม
+        y=alt.Y('Score', title='คะแนนสะสม (XP)'),
+        # สีเส้นแบ่งตามชื่อกลุ่ม
+        color=alt.Color('Group', scale=alt.Scale(scheme='category20'), title='ชื่อกลุ่ม'),
+        # Tooltip เวลาเอาเมาส์ชี้
+        tooltip=[
+            alt.Tooltip('Group', title='กลุ่ม'),
+            alt.Tooltip('Timestamp', title='เวลา', format='%d/%m %H:%M'),
+            alt.Tooltip('Score', title='คะแนนรวม'),
+            alt.Tooltip('Change', title='ล่าสุด (+/-)'),
+            alt.Tooltip('Reason', title='เหตุผล')
+        ]
+    ).properties(
+        height=450, # ความสูงกราฟ
+        width='container'
+    ).interactive() # ทำให้ซูมเข้าออก/เลื่อนได้
@@ -0,0 +1,62 @@
+# ==============================================================================
+# DATA EXPORT (สร้างไฟล์ตอนกดดาวน์โหลดเท่านั้น เขียนทีละก้อนจาก snapshot ปัจจุบัน)
+# ==============================================================================
+import io
+from datetime import timedelta
+
+EXPORT_CHUNK = 5000 # แถวต่อรอบการเขียน (ไม่ต้องสร้างสตริง CSV ของทั้งตารางในหน่วยความจำก่อน)
+HISTORY_COLS = ['Room', 'GroupName', 'Ts', 'Reason', 'Amount', 'Balance', 'EventId']
+TABLES = {"groups": "สรุปรายกลุ่ม", "history": "ประวัติรายรายการ (1 แถว/event)"}
+FORMATS = {"csv": ("CSV", "text/csv"), "parquet": ("Parquet", "application/vnd.apache.parquet")}
+# รูป leaderboard: ค่าที่ app.py ต้องรู้ก่อนกดดาวน์โหลด อยู่ที่นี่จะได้ไม่ต้อง import PIL ตอนเปิดหน้า
+IMAGE_PAGE_SIZE = 20 # กลุ่มต่อหน้า (~7,250px สูง, ~30MB RGB) ห้องที่ใหญ่กว่านี้ได้ ZIP ภาพทีละหน้า
+IMAGE_FORMATS = {"PNG": ("png", "image/png"), "WEBP": ("webp", "image/webp"), "JPEG": ("jpg", "image/jpeg")}
+
+def groups_table(df, room=None):
+    """แถวสรุปของทุกกลุ่ม (หรือเฉพาะห้อง) จาก snapshot ของ db.fetch()"""
+    if room is not None: df = df[df['Room'] == room]
+    return df.reset_index(drop=True)
+
+def history_table(db, room=None, start=None, end=None):
+    """Ledger แบบแบน เรียงตามเวลา กรองช่วงวันที่ [start, end] (date หรือ None)
+
+    Balance คิดจากประวัติทั้งหมดก่อนกรอง จึงยังเป็นยอดสะสมจริง ณ event นั้น
+    """
+    ev = db.events(room)
+    mask = ev['Ts'].notna()
+    # Ts เป็นสตริง 'YYYY-MM-DD HH:MM:SS' เทียบแบบสตริงได้เลย ไม่ต้องแปลงเวลาทั้งคอลัมน์
+    if start is not None: mask &= ev['Ts'] >= start.isoformat()
+    if end is not None: mask &= ev['Ts'] < (end + timedelta(days=1)).isoformat()
+    return ev.loc[mask, HISTORY_COLS].iloc[::-1].reset_index(drop=True)
+
+def write_csv(df, chunk=EXPORT_CHUNK):
+    buf = io.BytesIO()
+    if df.empty: buf.write(df.to_csv(index=False).encode('utf-8'))
+    for i in range(0, len(df), chunk):
+        buf.write(df.iloc[i:i + chunk].to_csv(index=False, header=i == 0).encode('utf-8'))
+    buf.seek(0)
+    return buf
+
+def write_parquet(df, chunk=EXPORT_CHUNK):
+    # pyarrow มากับ streamlit อยู่แล้ว แต่ import ตอนใช้จริงเท่านั้น
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    buf = io.BytesIO()
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(buf, schema) as w:
+        for i in range(0, len(df), chunk): # แต่ละก้อนเป็น row group หนึ่ง
+            w.write_table(pa.Table.from_pandas(df.iloc[i:i + chunk], schema=schema, preserve_index=False))
+    buf.seek(0)
+    return buf
+
+WRITERS = {"csv": write_csv, "parquet": write_parquet}
+
+def export_data(db, snapshot, table="groups", fmt="csv", room=None, start=None, end=None):
+    """ไฟล์สำหรับ st.download_button (เรียกตอนกดเท่านั้น) ช่วงวันที่ใช้กับ history"""
+    if table == "history": df = history_table(db, room, start, end)
+    else: df = groups_table(snapshot, room)
+    return WRITERS[fmt](df)
+
+def export_name(table="groups", fmt="csv", room=None):
+    name = f"{table}_{room}" if room else table
+    return f"{name.replace('/', '-')}.{fmt}"
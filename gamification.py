@@ -0,0 +1,203 @@
+# ==============================================================================
+# RANK & BADGE RULES (แยกจาก app.py: process ลูกแบบ spawn ตอน export ทุกห้อง import/unpickle ได้โดยไม่รันแอป)
+# ==============================================================================
+
+import os
+import json
+from bisect import bisect_right
+
+import numpy as np
+import pandas as pd
+
+# ตั้งยศเองได้ด้วยไฟล์ JSON (list ของ dict แบบเดียวกับด้านล่าง) ผ่าน env RANKS_FILE
+RANKS_FILE = os.environ.get("RANKS_FILE")
+DEFAULT_RANKS = [
+    {"name": "PRESIDENT", "th": "👑 ประธานรุ่น", "min_xp": 1000, "color": "#f59e0b", "bg": "#fef3c7"},
+    {"name": "DIRECTOR", "th": "💼 หัวหน้าฝ่าย", "min_xp": 600, "color": "#8b5cf6", "bg": "#f3e8ff"},
+    {"name": "MANAGER", "th": "👔 หัวหน้าแผนก", "min_xp": 300, "color": "#3b82f6", "bg": "#dbeafe"},
+    {"name": "EMPLOYEE", "th": "👨‍💼 พนักงาน", "min_xp": 100, "color": "#10b981", "bg": "#d1fae5"},
+    {"name": "INTERN", "th": "👶 เด็กฝึกงาน", "min_xp": 0, "color": "#64748b", "bg": "#f1f5f9"},
+    {"name": "PROBATION", "th": "⚠️ ทัณฑ์บน", "min_xp": -999999, "color": "#ef4444", "bg": "#fee2e2"}
+]
+
+class RankSystem:
+    """ยศตาม XP: ยศที่ min_xp < 0 คือยศของคะแนนติดลบ ที่เหลือเทียบ min_xp ด้วย binary search"""
+    def __init__(self, ranks=None):
+        # เรียงจากยศสูงสุดลงมา (ranks[i-1] คือยศถัดไปของ ranks[i])
+        self.ranks = sorted(ranks or DEFAULT_RANKS, key=lambda r: r['min_xp'], reverse=True)
+        self.n_up = sum(r['min_xp'] >= 0 for r in self.ranks) # จำนวนยศที่ไม่ใช่ยศติดลบ
+        # เกณฑ์เรียงน้อยไปมากสำหรับ bisect/searchsorted
+        self.thresholds = np.array([r['min_xp'] for r in self.ranks[:self.n_up]][::-1])
+        self._cols = pd.DataFrame(self.ranks)[['name', 'th', 'color', 'bg']]
+        self._min = np.array([r['min_xp'] for r in self.ranks])
+        self._th = np.array([r['th'] for r in self.ranks], dtype=object)
+
+    @classmethod
+    def load(cls, path=RANKS_FILE):
+        if not path: return cls()
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def _index(self, xp):
+        if xp < 0 and self.n_up < len(self.ranks): return len(self.ranks) - 1
+        i = bisect_right(self.thresholds, xp) - 1
+        return self.n_up - 1 - max(i, 0)
+
+    def get_rank(self, xp):
+        return self.ranks[self._index(xp)]
+
+    def get_progress(self, xp):
+        if xp < 0: return 0.0, "🔴 Warning: Negative Score"
+        i = self._index(xp)
+        if i > 0:
+            prev = self.ranks[i-1]
+            pct = min(1.0, xp / prev['min_xp'])
+            return pct, f"{int(pct*100)}% to {prev['th']}"
+        return 1.0, "MAX LEVEL"
+
+    def rank_index(self, xp):
+        """index ใน self.ranks ของ XP ทั้งชุด (searchsorted ครั้งเดียว)"""
+        xp = np.asarray(xp)
+        i = np.searchsorted(self.thresholds, xp, side='right') - 1
+        idx = self.n_up - 1 - np.maximum(i, 0)
+        if self.n_up < len(self.ranks): idx = np.where(xp < 0, len(self.ranks) - 1, idx)
+        return idx
+
+    def ranks_for(self, xp):
+        """คอลัมน์ rank (index), name, th, color, bg ของ XP ทั้งห้องในครั้งเดียว (index ตาม xp)"""
+        xp = pd.Series(xp)
+        idx = self.rank_index(xp.to_numpy())
+        out = self._cols[['name', 'th', 'color', 'bg']].iloc[idx].set_axis(xp.index)
+        out.insert(0, 'rank', idx)
+        return out
+
+    def progress_for(self, xp):
+        """คอลัมน์ pct และ label (แบบเดียวกับ get_progress) ของ XP ทั้งห้อง"""
+        xp = pd.Series(xp)
+        v = xp.to_numpy()
+        idx = self.rank_index(v)
+        neg = v < 0
+        mid = (idx > 0) & ~neg # ยังมียศถัดไป: เทียบกับ min_xp ของยศนั้น
+        pct = np.where(neg, 0.0, 1.0)
+        pct[mid] = np.minimum(1.0, v[mid] / self._min[idx[mid] - 1])
+        label = np.where(neg, "🔴 Warning: Negative Score", "MAX LEVEL").astype(object)
+        # ประกอบสตริงทีละแถว: ถ้าไม่มีแถวไหนอยู่กลางยศ array ว่างของ numpy + str จะ error (pandas 3 / numpy 2)
+        label[mid] = [f"{int(p * 100)}% to {t}" for p, t in zip(pct[mid], self._th[idx[mid] - 1])]
+        return pd.DataFrame({'pct': pct, 'label': label}, index=xp.index)
+
+# ------------------------------------------------------------------------------
+# Badge: ตัดสินจากสถิติสะสมของกลุ่ม ซึ่งอัปเดตทีละ event แบบ O(1) (ไม่ต้องไล่ประวัติใหม่)
+# ------------------------------------------------------------------------------
+STATS = ('events', 'max_award', 'min_balance', 'balance', 'streak', 'best_streak', 'risen')
+BADGE_RULES = {} # name -> (icon, rule, sticky)
+# event สรุปยอดยกมา (บีบอัดประวัติ): Amount = balance, สถิติที่เหลือเก็บใน EventId "ckpt:events:max_award:..."
+CHECKPOINT = "ckpt:"
+CHECKPOINT_STATS = ('events', 'max_award', 'min_balance', 'streak', 'best_streak', 'risen')
+
+def badge(name, icon, sticky=False):
+    """ลงทะเบียน badge: rule รับสถิติ (dict ของกลุ่มเดียว หรือ DataFrame ทั้งห้อง) คืน bool
+
+    sticky=True: ได้แล้วไม่หาย (rule ดูเฉพาะสถิติที่ไม่มีวันลดลง)
+    """
+    def register(rule):
+        BADGE_RULES[name] = (icon, rule, sticky)
+        return rule
+    return register
+
+@badge("wealthy", "💎")
+def _wealthy(s): return s['balance'] >= 800
+
+@badge("sniper", "🎯", sticky=True)
+def _sniper(s): return s['max_award'] >= 100
+
+@badge("debtor", "💸")
+def _debtor(s): return s['balance'] < 0
+
+@badge("phoenix", "🔥", sticky=True)
+def _phoenix(s): return s['risen'] > 0 # เคยติดลบแล้วกลับมา >= 0
+
+@badge("first_blood", "🩸", sticky=True)
+def _first_blood(s): return s['events'] > 0
+
+class BadgeEngine:
+    def __init__(self, rules=None):
+        self.rules = rules or BADGE_RULES
+        self.catalog = {name: icon for name, (icon, _, _) in self.rules.items()}
+        self.sticky = {name for name, (_, _, sticky) in self.rules.items() if sticky}
+
+    @staticmethod
+    def new_stats():
+        return dict.fromkeys(STATS, 0)
+
+    @staticmethod
+    def step(stats, amount):
+        """สถิติหลังได้ event ใหม่หนึ่งรายการ"""
+        s = dict(stats)
+        bal = s['balance'] + amount
+        s['risen'] = int(s['risen'] or s['balance'] < 0 <= bal)
+        s['events'] += 1
+        s['max_award'] = max(s['max_award'], amount)
+        s['min_balance'] = min(s['min_balance'], bal)
+        s['balance'] = bal
+        s['streak'] = s['streak'] + 1 if amount > 0 else 0 # คะแนนบวกติดต่อกัน
+        s['best_streak'] = max(s['best_streak'], s['streak'])
+        return s
+
+    @staticmethod
+    def checkpoint_id(stats):
+        """EventId ของ event ยอดยกมาที่แทนประวัติซึ่งมีสถิติ stats"""
+        return CHECKPOINT + ":".join(str(int(stats[k])) for k in CHECKPOINT_STATS)
+
+    @staticmethod
+    def is_checkpoint(ids):
+        return ids.astype(str).str.startswith(CHECKPOINT)
+
+    @staticmethod
+    def stats_from_events(ev, keys=('Room', 'GroupName')):
+        """สถิติของทุกกลุ่มจาก event (คอลัมน์ keys + Amount เรียงตามเวลาแล้ว) ด้วย groupby ชุดเดียว
+
+        ถ้ามีคอลัมน์ EventId แถว checkpoint (ยอดยกมา) จะเริ่มสถิติของกลุ่มจากค่าที่เก็บไว้ในแถวนั้น
+        """
+        keys = list(keys)
+        if ev.empty: return pd.DataFrame(columns=list(STATS), index=pd.MultiIndex.from_tuples([], names=keys))
+        by = [ev[k] for k in keys]
+        amt = ev['Amount'].astype(int)
+        bal = amt.groupby(by).cumsum()
+        pos = amt > 0
+        # ค่าต่อแถวที่ใช้รวม: event ปกตินับ 1 ครั้ง, checkpoint แทนสถิติของช่วงที่ถูกพับไว้ทั้งก้อน
+        n, award, low, weight = pd.Series(1, index=ev.index), amt.copy(), bal.copy(), pos.astype(int)
+        risen = (bal - amt < 0) & (bal >= 0)
+        best = None
+        ck = BadgeEngine.is_checkpoint(ev['EventId']) if 'EventId' in ev else None
+        if ck is not None and ck.any():
+            seed = ev.loc[ck, 'EventId'].astype(str).str[len(CHECKPOINT):].str.split(':', expand=True)
+            seed = seed.reindex(columns=range(len(CHECKPOINT_STATS))).apply(pd.to_numeric, errors='coerce').fillna(0).astype(int)
+            seed.columns = list(CHECKPOINT_STATS)
+            n[ck], award[ck], low[ck] = seed['events'], seed['max_award'], seed['min_balance']
+            pos = pos | ck # streak ที่ยกมาต่อกับ event บวกถัดไปได้
+            weight[ck] = seed['streak']
+            risen = risen.where(~ck, seed['risen'] > 0)
+            best = seed['best_streak']
+        # streak: event บวกนับต่อกัน เจอ event ที่ไม่บวกเริ่มนับใหม่
+        run = (~pos).astype(int).groupby(by).cumsum()
+        streak = weight.groupby(by + [run]).cumsum()
+        peak = streak if best is None else streak.where(~ck, np.maximum(streak, best.reindex(ev.index).fillna(0)))
+        tmp = pd.DataFrame({**{k: ev[k] for k in keys}, 'n': n, 'award': award, 'low': low, 'bal': bal,
+                            'streak': streak, 'peak': peak, 'risen': risen})
+        out = tmp.groupby(keys, sort=False).agg(
+            events=('n', 'sum'), max_award=('award', 'max'), min_balance=('low', 'min'), balance=('bal', 'last'),
+            streak=('streak', 'last'), best_streak=('peak', 'max'), risen=('risen', 'any'))
+        out['max_award'] = out['max_award'].clip(lower=0) # เริ่มนับจาก 0 เหมือน step()
+        out['min_balance'] = out['min_balance'].clip(upper=0)
+        return out[list(STATS)].astype(int)
+
+    def evaluate(self, stats):
+        """badge ของกลุ่มเดียวจากสถิติ"""
+        return [name for name, (_, rule, _) in self.rules.items() if rule(stats)]
+
+    def evaluate_frame(self, stats):
+        """badge ของหลายกลุ่มพร้อมกัน (stats เป็น DataFrame คอลัมน์ STATS) คืน Series ของ list"""
+        names = np.array(list(self.rules), dtype=object)
+        hits = np.column_stack([np.asarray(rule(stats), dtype=bool) for _, rule, _ in self.rules.values()]) \
+            if len(stats) else np.zeros((0, len(names)), dtype=bool)
+        return pd.Series([list(names[h]) for h in hits], index=stats.index, dtype=object)
@@ -0,0 +1,540 @@
+import os
+import io
+import math
+import zlib
+import zipfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import json
+import hashlib
+import threading
+import functools
+from collections import OrderedDict
+from datetime import datetime
+
+from PIL import Image, ImageDraw, ImageFont
+from pilmoji import Pilmoji
+from pilmoji.source import BaseSource
+
+import perf
+from exports import IMAGE_FORMATS, IMAGE_PAGE_SIZE as PAGE_SIZE
+
+# ==============================================================================
+# FONT REGISTRY (โหลดฟอนต์ครั้งเดียวต่อ process)
+# ==============================================================================
+# app.py ถูกรันใหม่ทุกครั้งที่มี rerun ดังนั้นแคชต้องอยู่ในโมดูลที่ถูก import
+FONT_DIR = os.path.dirname(os.path.abspath(__file__))
+FONT_BOLD = "Sarabun-Bold.ttf"
+FONT_REGULAR = "Sarabun-Regular.ttf"
+
+# ขนาดฟอนต์ชื่อกลุ่มที่ยอมให้ใช้ (85 ลงไปทีละ 5 จนถึง 40)
+NAME_SIZES = tuple(range(85, 39, -5))
+
+
+@functools.lru_cache(maxsize=None)
+def load_font(name, size):
+    """คืน FreeTypeFont ของ (ไฟล์ฟอนต์, ขนาด) โดยโหลดจากดิสก์แค่ครั้งแรก"""
+    try: return ImageFont.truetype(os.path.join(FONT_DIR, name), size)
+    except: return ImageFont.load_default()
+
+
+@functools.lru_cache(maxsize=2048)
+def fit_font_size(text, max_width, name=FONT_BOLD, sizes=NAME_SIZES):
+    """หาขนาดฟอนต์ใหญ่สุดใน sizes (เรียงจากมากไปน้อย) ที่ข้อความกว้างไม่เกิน max_width
+
+    ใช้ binary search จึงวัดความกว้างแค่ ~log2(len(sizes)) ครั้ง
+    ถ้าไม่มีขนาดไหนพอดีจะคืนขนาดเล็กสุด (เหมือน logic เดิม)
+    """
+    lo, hi = 0, len(sizes) - 1
+    best = hi
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        if load_font(name, sizes[mid]).getlength(text) <= max_width:
+            best = mid
+            hi = mid - 1
+        else:
+            lo = mid + 1
+    return sizes[best]
+
+
+def fit_font(text, max_width, name=FONT_BOLD, sizes=NAME_SIZES):
+    return load_font(name, fit_font_size(text, max_width, name, sizes))
+
+
+# ==============================================================================
+# EMOJI SOURCE (อ่านอีโมจิจากดิสก์ ไม่ยิง HTTP ไปที่ CDN)
+# ==============================================================================
+# 1) โฟลเดอร์ PNG แบบ Twemoji (เช่น emoji/1f3c6.png) วางไว้ข้างแอป
+# 2) ถ้าไม่มีไฟล์ ใช้ฟอนต์อีโมจิสีของระบบ (apt: fonts-noto-color-emoji ใน packages.txt)
+# ถ้าไม่เจอทั้งสองทาง Pilmoji จะวาดเป็นตัวอักษรธรรมดาแทน (ไม่มี network I/O เด็ดขาด)
+EMOJI_DIR = os.environ.get("EMOJI_DIR", os.path.join(FONT_DIR, "emoji"))
+EMOJI_FONT = os.environ.get("EMOJI_FONT", "/usr/share/fonts/truetype/noto/NotoColorEmoji.ttf")
+EMOJI_FONT_SIZE = 109 # NotoColorEmoji (CBDT) มี bitmap แค่ขนาดนี้
+
+
+def _emoji_filenames(emoji):
+    cps = [f"{ord(c):x}" for c in emoji]
+    # Twemoji ตัด FE0F ทิ้งถ้าไม่ใช่ลำดับ ZWJ
+    if "200d" not in cps:
+        yield "-".join(c for c in cps if c != "fe0f") + ".png"
+    yield "-".join(cps) + ".png"
+
+
+@functools.lru_cache(maxsize=1)
+def _emoji_font():
+    try: return ImageFont.truetype(EMOJI_FONT, EMOJI_FONT_SIZE)
+    except: return None
+
+
+@functools.lru_cache(maxsize=256)
+def _emoji_base(emoji):
+    """รูปอีโมจิ (RGBA ความละเอียดต้นฉบับ) หรือ None ถ้าหาไม่เจอ"""
+    for fn in _emoji_filenames(emoji):
+        path = os.path.join(EMOJI_DIR, fn)
+        if os.path.isfile(path):
+            with Image.open(path) as im:
+                return im.convert('RGBA')
+
+    font = _emoji_font()
+    if font is None:
+        return None
+    try:
+        canvas = Image.new('RGBA', (EMOJI_FONT_SIZE * 2, EMOJI_FONT_SIZE * 2))
+        ImageDraw.Draw(canvas).text((0, 0), emoji, font=font, embedded_color=True)
+        bbox = canvas.getbbox()
+        return canvas.crop(bbox) if bbox else None
+    except: return None
+
+
+@functools.lru_cache(maxsize=512)
+def emoji_bitmap(emoji, size):
+    """PNG ของอีโมจิที่ย่อเป็นกว้าง size px แล้ว (LRU ตาม (emoji, size))
+
+    เก็บเป็น PNG แบบไม่บีบอัด เพราะ Pilmoji รับได้แค่ stream:
+    การ decode จึงเป็นแค่การ copy และ resize ใน Pilmoji กลายเป็น no-op
+    """
+    base = _emoji_base(emoji)
+    if base is None or size <= 0:
+        return None
+    scaled = base.resize((size, math.ceil(base.height / base.width * size)), Image.Resampling.LANCZOS)
+    buf = io.BytesIO()
+    scaled.save(buf, format='PNG', compress_level=0)
+    return buf.getvalue()
+
+
+class LocalEmojiSource(BaseSource):
+    """Emoji source ของ Pilmoji ที่อ่านจาก emoji_bitmap() อย่างเดียว
+
+    size ถูกตั้งโดย EmojiPilmoji ก่อนวาดแต่ละข้อความ (สร้างใหม่ทุกภาพ จึงไม่แชร์ข้าม thread)
+    """
+    def __init__(self):
+        self.size = None
+
+    def get_emoji(self, emoji, /):
+        with perf.span("emoji_lookup"):
+            data = emoji_bitmap(emoji, self.size) if self.size else None
+        return io.BytesIO(data) if data else None
+
+    def get_discord_emoji(self, id, /):
+        return None
+
+
+class EmojiPilmoji(Pilmoji):
+    """Pilmoji ที่บอกขนาดฟอนต์ให้ LocalEmojiSource เพื่อดึงบิตแมปที่ย่อไว้แล้ว"""
+    def __init__(self, image, **kwargs):
+        # ปิดแคชของ Pilmoji เอง (มัน key ด้วย emoji อย่างเดียว ไม่สนขนาด)
+        super().__init__(image, source=LocalEmojiSource(), cache=False, **kwargs)
+
+    def text(self, xy, text, fill=None, font=None, *args, **kwargs):
+        scale = kwargs.get('emoji_scale_factor') or self._default_emoji_scale_factor
+        size = getattr(font, 'size', None)
+        self.source.size = round(scale * size) if size else None
+        return super().text(xy, text, fill, font, *args, **kwargs)
+
+
+# ==============================================================================
+# ฟังก์ชันสร้างรูปภาพ (Tile-based: วาดเฉพาะส่วนที่เปลี่ยน แล้วแปะรวมกัน)
+# ==============================================================================
+COLOR_BG = "#F8FAFC"
+COLOR_HEADER = "#4338CA"
+COLOR_CARD = "#FFFFFF"
+COLOR_SHADOW = "#CBD5E1"
+
+W = 1400
+ROW_H = 320
+HEADER_H = 700
+FOOTER_H = 150
+
+# การ์ดแต่ละใบ (รวมเงา) วาดลง tile ขนาดนี้ แล้วแปะที่ x = CARD_X
+CARD_X = 40
+CARD_W = W - 80
+TILE_W = CARD_W + 6
+TILE_H = ROW_H - 14
+
+# tile ดิบละ ~1.2MB แต่เก็บในแคชแบบ zlib (~25KB, แตกกลับ ~4ms เทียบกับวาดใหม่ ~18ms)
+# 96 ใบจึงใช้แรมแค่ ~2.5MB (ถ้าแคชเล็กกว่าจำนวนกลุ่มในห้อง LRU จะพลาดทุกใบเมื่อวาดไล่ทั้งบอร์ด)
+TILE_CACHE_SIZE = 96
+
+
+@functools.lru_cache(maxsize=4) # ~3.4MB ต่อห้อง แตกจาก zlib ไม่เร็วกว่าวาดใหม่มากนักจึงเก็บดิบแต่น้อยใบ
+def _header_tile(room_name):
+    """ส่วนหัว (พื้นหลัง, วงกลม, ถ้วย, ชื่อห้อง) วาดครั้งเดียวต่อชื่อห้อง"""
+    # วงกลมซ้ายล่างยื่นเลย HEADER_H ลงมาถึง y=800 จึงเผื่อความสูงไว้
+    tile = Image.new('RGB', (W, HEADER_H + 101), color=COLOR_BG)
+    f_icon = load_font(FONT_BOLD, 200)
+    f_sub = load_font(FONT_BOLD, 65)
+    f_header = load_font(FONT_BOLD, 160)
+
+    with EmojiPilmoji(tile) as pilmoji:
+        draw = pilmoji.draw
+        draw.rectangle([(0, 0), (W, HEADER_H)], fill=COLOR_HEADER)
+        draw.ellipse([(1000, -100), (1600, 500)], fill='#4F46E5')
+        draw.ellipse([(-100, 300), (400, 800)], fill='#3730A3')
+
+        pilmoji.text((W//2, 180), "🏆", font=f_icon, fill='white', anchor="mm")
+        pilmoji.text((W//2, 360), "CLASSROOM LEADERBOARD", font=f_sub, fill='#A5B4FC', anchor="mm")
+        pilmoji.text((W//2, 550), f"{room_name}", font=f_header, fill='white', anchor="mm")
+    return tile
+
+
+@functools.lru_cache(maxsize=1)
+def _card_mask():
+    """รูปทรงการ์ด + เงา ใช้เป็น mask ตอนแปะ tile (ส่วนนอกการ์ดไม่ทับของเดิม)"""
+    mask = Image.new('L', (TILE_W, TILE_H), 0)
+    draw = ImageDraw.Draw(mask)
+    draw.rounded_rectangle([(5, 10), (CARD_W+5, ROW_H-15)], radius=35, fill=255)
+    draw.rounded_rectangle([(0, 0), (CARD_W, ROW_H-25)], radius=35, fill=255)
+    return mask
+
+
+def _card_tile(*key):
+    """การ์ดของกลุ่ม (key เหมือน _draw_card) จากแคชแบบบีบอัด"""
+    return Image.frombytes('RGB', (TILE_W, TILE_H), zlib.decompress(_packed_tile(*key)))
+
+
+@functools.lru_cache(maxsize=TILE_CACHE_SIZE)
+def _packed_tile(*key):
+    return zlib.compress(_draw_card(*key).tobytes(), 1)
+
+
+def _draw_card(pos, grp_name, mem, xp, pct, rank_color, rank_th):
+    """การ์ดของกลุ่มอันดับ pos (เริ่มที่ 0) ตามอันดับ + เนื้อหา + สียศ
+
+    พิกัดในนี้เป็นพิกัดภายใน tile (x ของภาพเต็ม ลบ CARD_X)
+    """
+    if pos == 0:   theme_col = "#F59E0B"
+    elif pos == 1: theme_col = "#94A3B8"
+    elif pos == 2: theme_col = "#B45309"
+    else:          theme_col = "#64748B"
+
+    xp_col = "#EF4444" if xp < 0 else "#10B981"
+
+    f_rank = load_font(FONT_BOLD, 90)
+    f_mem = load_font(FONT_REGULAR, 50)
+    f_score = load_font(FONT_BOLD, 110)
+    f_badge = load_font(FONT_BOLD, 55)
+
+    tile = Image.new('RGB', (TILE_W, TILE_H), color=COLOR_BG)
+    with EmojiPilmoji(tile) as pilmoji:
+        draw = pilmoji.draw
+
+        # Card Box
+        draw.rounded_rectangle([(5, 10), (CARD_W+5, ROW_H-15)], radius=35, fill=COLOR_SHADOW)
+        draw.rounded_rectangle([(0, 0), (CARD_W, ROW_H-25)], radius=35, fill=COLOR_CARD)
+
+        # --- Column 1: Rank Circle ---
+        circle_x = 150 - CARD_X
+        circle_y = 120
+        r = 80
+        draw.ellipse([(circle_x-r, circle_y-r), (circle_x+r, circle_y+r)], fill=theme_col)
+        pilmoji.text((circle_x, circle_y), str(pos+1), font=f_rank, fill="white", anchor="mm")
+
+        # --- Column 2: Info (Smart Name Resizing) ---
+        text_x = 280 - CARD_X
+
+        # ปรับขนาดฟอนต์ชื่อกลุ่ม: ใหญ่สุด 85 เล็กสุด 40
+        # ความกว้างสูงสุดที่ยอมรับได้ 750 (ไม่ให้ชนคะแนน)
+        f_dynamic_name = fit_font(grp_name, 750)
+        pilmoji.text((text_x, 100), grp_name, font=f_dynamic_name, fill="#1E293B", anchor="ls")
+
+        # สมาชิก
+        if len(mem) > 60: mem = mem[:58] + "..."
+        pilmoji.text((text_x, 170), mem, font=f_mem, fill="#64748B", anchor="ls")
+
+        # Progress Bar
+        bar_w = 650
+        bar_h = 16
+        bar_y = 220
+
+        draw.rounded_rectangle([(text_x, bar_y), (text_x+bar_w, bar_y+bar_h)], radius=8, fill="#F1F5F9")
+        fill_w = int(bar_w * pct)
+        if fill_w > 0:
+            draw.rounded_rectangle([(text_x, bar_y), (text_x+fill_w, bar_y+bar_h)], radius=8, fill=rank_color)
+
+        # Badge Name
+        pilmoji.text((text_x + bar_w + 30, bar_y+14), rank_th, font=f_badge, fill=rank_color, anchor="ls")
+
+        # --- Column 3: Score ---
+        pilmoji.text((W-100-CARD_X, 110), f"{xp}", font=f_score, fill=xp_col, anchor="rs")
+        pilmoji.text((W-100-CARD_X, 160), "XP", font=f_badge, fill="#94A3B8", anchor="rs")
+    return tile
+
+
+@functools.lru_cache(maxsize=32)
+def _footer_mask(text):
+    """ข้อความ footer เป็น mask (L) เพื่อแปะสีทับได้โดยขอบตัวอักษรเนียนเหมือนวาดตรง"""
+    mask = Image.new('L', (W, FOOTER_H), 0)
+    ImageDraw.Draw(mask).text((W//2, FOOTER_H-70), text, font=load_font(FONT_REGULAR, 50), fill=255, anchor="mm")
+    return mask
+
+
+def _sorted_rows(df, rank_sys):
+    """แถวเรียงตาม XP พร้อมยศ/เปอร์เซ็นต์ที่คิดทั้งห้องในครั้งเดียว: (group, members, xp, pct, color, th)"""
+    sorted_df = df.sort_values("XP", ascending=False).reset_index(drop=True)
+    rank = rank_sys.ranks_for(sorted_df['XP'])
+    pct = rank_sys.progress_for(sorted_df['XP'])['pct']
+    return [(str(g), str(m), int(x), float(p), c, th) for g, m, x, p, c, th in
+            zip(sorted_df['GroupName'], sorted_df['Members'], sorted_df['XP'], pct, rank['color'], rank['th'])]
+
+
+def _compose(room_name, rows, start, footer_text):
+    """ประกอบภาพหนึ่งหน้า: header + การ์ดของ rows (อันดับเริ่มที่ start) + footer"""
+    H = HEADER_H + (len(rows) * ROW_H) + FOOTER_H
+
+    img = Image.new('RGB', (W, H), color=COLOR_BG)
+    img.paste(_header_tile(str(room_name)), (0, 0))
+
+    # การ์ดที่อันดับและเนื้อหาไม่เปลี่ยนจะได้ tile เดิมจากแคช ไม่ต้องวาดใหม่
+    mask = _card_mask()
+    current_y = HEADER_H + 50
+    for i, row in enumerate(rows, start):
+        tile = _card_tile(i, *row)
+        img.paste(tile, (CARD_X, current_y), mask)
+        current_y += ROW_H
+
+    # Footer
+    img.paste("#94A3B8", (0, H - FOOTER_H), _footer_mask(footer_text))
+    return img
+
+
+def generate_image(room_name, df, rank_sys, date=None):
+    if date is None: date = datetime.now().strftime('%d/%m/%Y')
+    with perf.span("generate_image"):
+        img = _compose(room_name, _sorted_rows(df, rank_sys), 0, f"Generated by Classroom OS • {date}")
+        data = encode_image(img)
+    perf.count("image_bytes", len(data))
+    return data
+
+
+# ==============================================================================
+# PAGED OUTPUT (บอร์ดใหญ่: แบ่งหน้า ใช้แรมเท่ากับหน้าเดียวเสมอ)
+# ==============================================================================
+# ขนาดสูงสุดที่ encoder รับได้
+MAX_DIM = {"WEBP": 16383, "JPEG": 65500}
+
+
+def render_pages(room_name, df, rank_sys, per_page=PAGE_SIZE, date=None):
+    """yield ภาพ PIL ทีละหน้า (อันดับนับต่อเนื่องข้ามหน้า) ถือไว้ในแรมแค่หน้าเดียว"""
+    if date is None: date = datetime.now().strftime('%d/%m/%Y')
+    rows = _sorted_rows(df, rank_sys)
+    n_pages = max(1, math.ceil(len(rows) / per_page))
+    for p in range(n_pages):
+        footer = f"Generated by Classroom OS • {date}"
+        if n_pages > 1: footer += f" • หน้า {p+1}/{n_pages}"
+        yield _compose(room_name, rows[p*per_page:(p+1)*per_page], p*per_page, footer)
+
+
+# WebP method 2 เร็วกว่าค่า default (4) ~2.5 เท่า ไฟล์ใหญ่ขึ้นแค่ไม่กี่ %
+ENCODE_PARAMS = {"PNG": {}, "JPEG": {"optimize": True}, "WEBP": {"method": 2}}
+QUALITY_STEPS = tuple(range(30, 96, 5))
+
+
+def _encode(img, fmt, quality=None):
+    buf = io.BytesIO()
+    params = dict(ENCODE_PARAMS[fmt])
+    if quality is not None: params['quality'] = quality
+    img.save(buf, format=fmt, **params)
+    return buf.getvalue()
+
+
+def encode_image(img, fmt="PNG", max_bytes=None):
+    """แปลงภาพเป็น PNG / JPEG / WEBP
+
+    ถ้ากำหนด max_bytes (ใช้กับ JPEG/WEBP) จะ binary search หา quality สูงสุด (ทีละ 5) ที่ไม่เกินงบ
+    ถ้า quality ต่ำสุดยังเกิน จะย่อภาพลงแล้วลองใหม่ (ย่อ 4 รอบแล้วยังเกิน: ValueError)
+    """
+    fmt = fmt.upper()
+    if fmt == "JPG": fmt = "JPEG"
+    if fmt not in ENCODE_PARAMS:
+        raise ValueError(f"Unsupported format: {fmt}")
+    if max(img.size) > MAX_DIM.get(fmt, 1 << 31):
+        raise ValueError(f"{fmt} รองรับสูงสุด {MAX_DIM[fmt]}px (ภาพสูง {img.height}px) ให้ใช้โหมดแบ่งหน้า")
+
+    if fmt == "PNG":
+        return _encode(img, fmt)
+    if not max_bytes:
+        return _encode(img, fmt, quality=90)
+
+    for _ in range(4):
+        lo, hi, best = 0, len(QUALITY_STEPS) - 1, None
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            data = _encode(img, fmt, quality=QUALITY_STEPS[mid])
+            if len(data) <= max_bytes:
+                best, lo = data, mid + 1
+            else:
+                hi = mid - 1
+        if best is not None:
+            return best
+        # ไฟล์ยังใหญ่เกินที่ quality ต่ำสุด: ย่อตามสัดส่วนพื้นที่ที่ต้องลด
+        data = _encode(img, fmt, quality=QUALITY_STEPS[0])
+        scale = max(0.25, 0.9 * (max_bytes / len(data)) ** 0.5)
+        img = img.resize((max(1, int(img.width * scale)), max(1, int(img.height * scale))), Image.Resampling.LANCZOS)
+    data = _encode(img, fmt, quality=QUALITY_STEPS[0])
+    if len(data) > max_bytes:
+        raise ValueError(f"{fmt} บีบอัดให้ไม่เกิน {max_bytes:,} bytes ไม่ได้ (เล็กสุด {len(data):,} bytes ที่ {img.width}x{img.height}px)")
+    return data
+
+
+def leaderboard_pages(room_name, df, rank_sys, per_page=PAGE_SIZE, fmt="PNG", max_bytes=None, date=None):
+    """yield ไฟล์ภาพทีละหน้า (max_bytes คืองบต่อหน้า) ภาพดิบหน้าก่อนถูกทิ้งก่อนวาดหน้าถัดไป"""
+    for page in render_pages(room_name, df, rank_sys, per_page, date):
+        yield encode_image(page, fmt, max_bytes)
+
+
+def leaderboard_pdf(room_name, df, rank_sys, per_page=PAGE_SIZE, quality=85):
+    """PDF หลายหน้า: เขียนต่อท้าย (append) ทีละหน้า จึงไม่ต้องถือทุกหน้าไว้พร้อมกัน"""
+    buf = io.BytesIO()
+    with perf.span("generate_pdf"):
+        for i, page in enumerate(render_pages(room_name, df, rank_sys, per_page)):
+            page.save(buf, format='PDF', append=i > 0, resolution=150, quality=quality)
+    perf.count("image_bytes", buf.tell())
+    return buf.getvalue()
+
+
+# ==============================================================================
+# IMAGE CACHE (content-addressed LRU: ข้อมูลเหมือนเดิม = ไม่ต้องวาดใหม่ เก็บไฟล์ทุกหน้าของห้องแยกตามขนาดหน้า/format/งบ)
+# ==============================================================================
+PNG_CACHE_SIZE = 32
+
+_png_cache = OrderedDict()
+_png_lock = threading.Lock()
+
+
+def leaderboard_key(room_name, df, date):
+    """hash ของทุกอย่างที่มีผลต่อภาพ: ชื่อห้อง, (GroupName, Members, XP) ของทุกกลุ่ม และวันที่ใน footer"""
+    rows = [[str(g), str(m), int(x)] for g, m, x in zip(df['GroupName'], df['Members'], df['XP'])]
+    payload = json.dumps([str(room_name), date, rows], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _cached(key, make):
+    """ค่าในแคชตาม key ถ้ายังไม่มีเรียก make() แล้วเก็บไว้"""
+    with _png_lock:
+        if key in _png_cache:
+            _png_cache.move_to_end(key)
+            return _png_cache[key]
+
+    data = make()
+
+    with _png_lock:
+        _png_cache[key] = data
+        _png_cache.move_to_end(key)
+        while len(_png_cache) > PNG_CACHE_SIZE:
+            _png_cache.popitem(last=False)
+    return data
+
+
+def pages_key(room_name, df, date, per_page=PAGE_SIZE, fmt="PNG", max_bytes=None):
+    return f"{leaderboard_key(room_name, df, date)}:{per_page}:{fmt}:{max_bytes or 0}"
+
+
+def _room_pages(room_name, df, rank_sys, per_page, fmt, max_bytes, date):
+    """ไฟล์ทุกหน้าของห้องเดียว (tuple) ระดับโมดูลจึงส่งเป็นงานให้ process ลูกได้"""
+    with perf.span("generate_pages"):
+        pages = tuple(leaderboard_pages(room_name, df, rank_sys, per_page, fmt, max_bytes, date))
+    perf.count("image_bytes", sum(map(len, pages)))
+    return pages
+
+
+def page_names(room_name, n_pages, fmt="PNG"):
+    """ชื่อไฟล์ใน ZIP: ห้องที่มีหน้าเดียวไม่ต้องมีเลขหน้า"""
+    safe = str(room_name).replace('/', '-').replace('\\', '-')
+    ext = IMAGE_FORMATS[fmt][0]
+    if n_pages == 1: return [f"Leaderboard_{safe}.{ext}"]
+    return [f"Leaderboard_{safe}_{i + 1:02d}.{ext}" for i in range(n_pages)]
+
+
+def _zip(files):
+    buf = io.BytesIO()
+    # PNG/WEBP/JPEG บีบอัดมาแล้ว เก็บแบบ STORED ไม่ต้องเสียเวลา deflate ซ้ำ
+    with zipfile.ZipFile(buf, 'w', compression=zipfile.ZIP_STORED) as zf:
+        for name, data in files:
+            zf.writestr(name, data)
+    return buf.getvalue()
+
+
+def leaderboard_file(room_name, df, rank_sys, fmt="PNG", max_bytes=None):
+    """ภาพเดียวทั้งบอร์ด (PNG / WEBP / JPEG, max_bytes = งบขนาดไฟล์) จากแคชถ้ามี ไม่งั้นวาดใหม่แล้วเก็บไว้"""
+    date = datetime.now().strftime('%d/%m/%Y')
+    # ห้องที่ไม่เกิน PAGE_SIZE ใช้ key เดียวกับโหมดแบ่งหน้า/export ทุกห้อง (ได้ภาพเดียวกัน)
+    per_page = max(PAGE_SIZE, len(df))
+    key = pages_key(room_name, df, date, per_page, fmt, max_bytes)
+    return _cached(key, lambda: _room_pages(room_name, df, rank_sys, per_page, fmt, max_bytes, date))[0]
+
+
+def leaderboard_zip(room_name, df, rank_sys, per_page=PAGE_SIZE, fmt="PNG", max_bytes=None):
+    """ZIP ของภาพหน้าละ per_page กลุ่ม (ห้องใหญ่: ไม่ต้องวาดภาพยาวทั้งบอร์ดในแรมทีเดียว)"""
+    date = datetime.now().strftime('%d/%m/%Y')
+    key = pages_key(room_name, df, date, per_page, fmt, max_bytes)
+    pages = _cached(key, lambda: _room_pages(room_name, df, rank_sys, per_page, fmt, max_bytes, date))
+    return _zip(zip(page_names(room_name, len(pages), fmt), pages))
+
+
+# ==============================================================================
+# BATCH EXPORT (วาดทุกห้องพร้อมกันใน process pool แล้วรวมเป็น ZIP เดียว)
+# วาดตัวอักษร (FreeType / ImageDraw) และแยก emoji ของ pilmoji ถือ GIL ตลอด thread จึงไม่ช่วยให้ใช้หลายคอร์
+# process ลูกเริ่มแบบ spawn ไม่ใช่ fork: server ของ Streamlit มีหลาย thread (lock ที่ถูกถือตอน fork จะค้างในลูก)
+# ลูก import แค่โมดูลนี้กับที่ต้องใช้ unpickle งาน (gamification / pandas) สคริปต์หลักของ streamlit มี __main__ guard จึงไม่ถูกรันซ้ำ
+# ==============================================================================
+def _export_pool(workers):
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def export_leaderboards(df, rank_sys, max_workers=None, per_page=PAGE_SIZE, fmt="PNG", max_bytes=None):
+    """ZIP ของรูป leaderboard ทุกห้องใน df (snapshot เดียวจาก DataManager.fetch) ห้องใหญ่แยกไฟล์หน้าละ per_page กลุ่ม
+
+    ห้องที่อยู่ในแคชแล้วไม่ต้องวาดใหม่ ที่เหลือกระจายไปตามจำนวนคอร์ (เหลือห้องเดียววาดเองไม่ต้องเปิด process)
+    """
+    date = datetime.now().strftime('%d/%m/%Y')
+    cols = ['GroupName', 'Members', 'XP']
+    rooms = {str(room): g[cols].reset_index(drop=True) for room, g in df.groupby('Room', sort=True)}
+
+    pages = {}
+    todo = {}
+    with _png_lock:
+        for room, room_df in rooms.items():
+            key = pages_key(room, room_df, date, per_page, fmt, max_bytes)
+            if key in _png_cache:
+                pages[room] = _png_cache[key]
+            else:
+                todo[room] = key
+
+    if todo:
+        job = (per_page, fmt, max_bytes, date)
+        workers = min(len(todo), max_workers or os.cpu_count() or 1)
+        if workers == 1:
+            pages.update((room, _room_pages(room, rooms[room], rank_sys, *job)) for room in todo)
+        else:
+            with _export_pool(workers) as pool:
+                futures = {room: pool.submit(_room_pages, room, rooms[room], rank_sys, *job) for room in todo}
+                for room, fut in futures.items():
+                    pages[room] = fut.result()
+
+        with _png_lock:
+            for room, key in todo.items():
+                _png_cache[key] = pages[room]
+            while len(_png_cache) > PNG_CACHE_SIZE:
+                _png_cache.popitem(last=False)
+
+    return _zip((name, data) for room in rooms for name, data in zip(page_names(room, len(pages[room]), fmt), pages[room]))
@@ -0,0 +1,132 @@
+# ==============================================================================
+# PERFORMANCE SPANS (จับเวลาแต่ละขั้นของ rerun + นับ byte/JSON แล้วเก็บ p50/p95 รวมทุก session)
+#   PERF_LOG=1            log หนึ่งบรรทัด JSON ต่อ rerun (logger "classroom.perf")
+#   PERF_PROM_FILE=path   เขียนไฟล์ข้อความแบบ Prometheus (textfile collector) หลังทุก rerun
+#   PERF_PANEL=1 หรือ ?perf=1  แสดงแผง Performance ใน sidebar
+# ไม่ import streamlit: storage / leaderboard_image / worker ตอน export เรียกใช้ได้
+# ==============================================================================
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+import numpy as np
+
+PERF_LOG = os.environ.get("PERF_LOG", "") not in ("", "0")
+PERF_PROM_FILE = os.environ.get("PERF_PROM_FILE")
+PERF_PANEL = os.environ.get("PERF_PANEL", "") not in ("", "0")
+PERF_WINDOW = int(os.environ.get("PERF_WINDOW", "500")) # จำนวนตัวอย่างล่าสุดต่อขั้นที่ใช้คิด p50/p95
+
+log = logging.getLogger("classroom.perf")
+if PERF_LOG and not log.handlers:
+    _h = logging.StreamHandler()
+    _h.setFormatter(logging.Formatter("%(asctime)s perf %(message)s"))
+    log.addHandler(_h)
+    log.setLevel(logging.INFO)
+    log.propagate = False
+
+# สถิติรวมของทั้ง process (ทุก session / thread รวมกัน) ส่วน rerun ปัจจุบันอยู่ใน thread-local
+_lock = threading.Lock()
+_samples = {} # stage -> deque ของ ms ล่าสุด
+_stages = {} # stage -> [จำนวนครั้ง, ms รวม] ตั้งแต่เปิด process
+_counters = {} # ชื่อ -> ค่ารวมตั้งแต่เปิด process
+_local = threading.local()
+
+def record(stage, ms):
+    with _lock:
+        _samples.setdefault(stage, deque(maxlen=PERF_WINDOW)).append(ms)
+        tot = _stages.setdefault(stage, [0, 0.0])
+        tot[0] += 1
+        tot[1] += ms
+    run = getattr(_local, 'run', None)
+    if run is not None:
+        acc = run['spans'].setdefault(stage, [0, 0.0]) # ขั้นที่เรียกหลายครั้ง (เช่น emoji_lookup) รวมเป็นแถวเดียว
+        acc[0] += 1
+        acc[1] += ms
+
+@contextmanager
+def span(stage):
+    t = time.perf_counter()
+    try: yield
+    finally: record(stage, (time.perf_counter() - t) * 1000)
+
+def timed(stage):
+    """decorator: จับเวลาทั้งฟังก์ชันเป็นขั้น stage"""
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage): return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+def count(name, n=1):
+    """นับ bytes_read / bytes_written / json_parses ฯลฯ"""
+    with _lock: _counters[name] = _counters.get(name, 0) + n
+    run = getattr(_local, 'run', None)
+    if run is not None: run['counts'][name] = run['counts'].get(name, 0) + n
+
+def frame_bytes(df):
+    """ขนาดโดยประมาณของตารางที่อ่าน/เขียน (ขนาดในหน่วยความจำ รวมสตริง)"""
+    return int(df.memory_usage(deep=True, index=False).sum())
+
+def rows_bytes(rows):
+    return sum(len(str(v).encode('utf-8')) for r in rows for v in r)
+
+# ------------------------------------------------------------------------------
+# ขอบเขตของ rerun (เรียกที่บนสุด/ล่างสุดของ app.py)
+# ------------------------------------------------------------------------------
+def begin():
+    _local.run = {'t': time.perf_counter(), 'spans': {}, 'counts': {}}
+
+def end(**labels):
+    """ปิด rerun ของ thread นี้: บันทึกขั้น "rerun" แล้วส่ง log / ไฟล์ Prometheus คืนข้อมูลของ rerun นี้"""
+    run = _local.__dict__.pop('run', None)
+    if run is None: return None
+    ms = (time.perf_counter() - run.pop('t')) * 1000
+    record("rerun", ms)
+    run['spans'] = {k: {"n": n, "ms": round(t, 3)} for k, (n, t) in run['spans'].items()}
+    run.update(labels, ms=round(ms, 3))
+    if PERF_LOG: log.info(json.dumps(run, ensure_ascii=False, default=str))
+    if PERF_PROM_FILE:
+        try: write_prometheus(PERF_PROM_FILE)
+        except OSError as e: log.warning("perf: write %s failed: %s", PERF_PROM_FILE, e)
+    return run
+
+# ------------------------------------------------------------------------------
+# สรุปผล
+# ------------------------------------------------------------------------------
+def summary():
+    """[{stage, n, p50, p95, max, total_ms}] เรียงตามเวลารวมมากสุดก่อน (ขั้นที่ควรแก้ก่อนอยู่บนสุด)"""
+    with _lock:
+        snap = {k: (np.fromiter(v, float), *_stages[k]) for k, v in _samples.items()}
+    out = [{"stage": k, "n": n, "p50": round(float(np.percentile(a, 50)), 3), "p95": round(float(np.percentile(a, 95)), 3),
+            "max": round(float(a.max()), 3), "total_ms": round(total, 1)}
+           for k, (a, n, total) in snap.items()]
+    return sorted(out, key=lambda r: r['total_ms'], reverse=True)
+
+def counters():
+    with _lock: return dict(_counters)
+
+def prometheus_text():
+    lines = ["# HELP classroom_stage_ms Duration of app stages in milliseconds (quantiles over the last PERF_WINDOW samples).",
+             "# TYPE classroom_stage_ms summary"]
+    for r in summary():
+        s = r['stage']
+        lines += [f'classroom_stage_ms{{stage="{s}",quantile="0.5"}} {r["p50"]}',
+                  f'classroom_stage_ms{{stage="{s}",quantile="0.95"}} {r["p95"]}',
+                  f'classroom_stage_ms_sum{{stage="{s}"}} {r["total_ms"]}',
+                  f'classroom_stage_ms_count{{stage="{s}"}} {r["n"]}']
+    lines += ["# HELP classroom_io_total Bytes read/written and JSON documents parsed.",
+              "# TYPE classroom_io_total counter"]
+    lines += [f'classroom_io_total{{counter="{k}"}} {v}' for k, v in sorted(counters().items())]
+    return "\n".join(lines) + "\n"
+
+def write_prometheus(path):
+    # เขียนไฟล์ชั่วคราวแล้วสลับ ตัวเก็บข้อมูลจะไม่อ่านเจอไฟล์ที่เขียนไม่ครบ
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f: f.write(prometheus_text())
+    os.replace(tmp, path)
@@ -0,0 +1,177 @@
+# ==============================================================================
+# STATIC UI (ธีม CSS + ตารางสิทธิพิเศษของยศ สร้างครั้งเดียวตอน import ไม่ต้องประกอบใหม่ทุก rerun)
+# ==============================================================================
+import re
+
+def _minify_css(css):
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    return re.sub(r"\s*([{};:,>])\s*", r"\1", css).strip()
+
+def _minify_html(html):
+    return "".join(line.strip() for line in html.splitlines())
+
+THEME_CSS = "<style>" + _minify_css("""
+@import url('https://fonts.googleapis.com/css2?family=Sarabun:wght@300;400;500;700&family=Prompt:wght@300;400;600&display=swap');
+
+:root {
+    --primary: #6366f1;
+    --success: #10b981;
+    --danger: #ef4444;
+    --bg-color: #f1f5f9;
+    --card-bg: #ffffff;
+}
+
+html, body, [class*="css"] {
+    font-family: 'Sarabun', 'Prompt', sans-serif;
+    background-color: var(--bg-color);
+    color: #0f172a;
+}
+
+/* Hero Header */
+.hero-container {
+    background: linear-gradient(120deg, #4f46e5, #3b82f6);
+    padding: 1.5rem;
+    border-radius: 16px;
+    color: white;
+    margin-bottom: 1.5rem;
+    box-shadow: 0 10px 15px -3px rgba(0, 0, 0, 0.1);
+    display: flex;
+    justify-content: space-between;
+    align-items: center;
+}
+
+/* Glass Cards */
+.glass-card {
+    background: var(--card-bg);
+    border-radius: 16px;
+    padding: 1.2rem;
+    border: 1px solid #e2e8f0;
+    box-shadow: 0 4px 6px -1px rgba(0, 0, 0, 0.05);
+    margin-bottom: 1rem;
+    transition: transform 0.2s;
+}
+
+/* Input & Select Styling */
+.stSelectbox div[data-baseweb="select"] {
+    border-radius: 10px;
+    border: 2px solid #e2e8f0;
+}
+.stTextInput input, .stNumberInput input {
+    border-radius: 10px;
+    border: 2px solid #e2e8f0;
+    padding: 10px;
+}
+
+/* Big Action Buttons */
+.stButton button {
+    width: 100%;
+    height: 50px;
+    border-radius: 12px !important;
+    font-weight: 600 !important;
+    font-size: 1rem !important;
+    box-shadow: 0 2px 4px rgba(0,0,0,0.05);
+    transition: all 0.2s;
+}
+.stButton button:hover {
+    transform: translateY(-2px);
+    box-shadow: 0 4px 6px rgba(0,0,0,0.1);
+}
+
+/* Status Indicators */
+.status-badge {
+    padding: 4px 12px;
+    border-radius: 20px;
+    font-size: 0.75rem;
+    font-weight: 800;
+    text-transform: uppercase;
+    color: white;
+}
+.score-positive { color: #10b981; font-weight: 800; }
+.xp-bar { height: 8px; margin-top: 8px; border-radius: 4px; background: #e2e8f0; overflow: hidden; }
+.xp-bar > div { height: 100%; background: var(--primary); }
+.score-negative { color: #ef4444; font-weight: 800; }
+
+/* Tabs */
+.stTabs [data-baseweb="tab-list"] {
+    background: white;
+    padding: 8px;
+    border-radius: 12px;
+    box-shadow: 0 1px 2px rgba(0,0,0,0.05);
+}
+""") + "</style>"
+
+# การ์ดสิทธิพิเศษของแต่ละยศ (ส่งเป็น element เดียว)
+RANK_CARDS = [
+    # 1. Intern
+    """
+<div class="rank-detail-card" style="border-left: 6px solid #64748b; padding: 20px; background: white; border-radius: 15px; margin-bottom: 20px; box-shadow: 0 4px 6px rgba(0,0,0,0.05);">
+    <h3 style="color:#64748b; margin:0;">👶 เด็กฝึกงาน (Intern)</h3>
+    <span class="status-badge" style="background:#f1f5f9; color:#64748b; padding: 2px 10px; border-radius: 10px; font-weight: bold; font-size: 0.8rem;">0+ XP</span>
+    <hr style="margin: 10px 0;">
+    <h4 style="margin:0;">🔍 สิทธิ์ Check-up (ตรวจสอบความถูกต้อง)</h4>
+    <p style="margin-top:5px;">ก่อนส่งใบงานชิ้นสำคัญ สามารถนำมาให้ครู "ตรวจทานเบื้องต้น" (Pre-check) ได้ ครูจะวงจุดที่ผิดให้กลับไปแก้ก่อนส่งจริง</p>
+    <div style="background-color: #f1f5f9; padding: 10px; border-radius: 8px; font-weight: 600; color: #334155; margin-top: 10px; border-left: 4px solid #64748b;">
+        💪 ได้รับ "คำแนะนำ" แต่ยังต้องลงมือทำและแก้ไขเองทั้งหมด
+    </div>
+    <p style="margin-top:10px; color:grey; font-size:0.9rem;">➡️ อีก 100 XP เพื่อเลื่อนยศเป็น พนักงาน</p>
+</div>
+""",
+    # 2. Employee
+    """
+<div class="rank-detail-card" style="border-left: 6px solid #10b981; padding: 20px; background: white; border-radius: 15px; margin-bottom: 20px; box-shadow: 0 4px 6px rgba(0,0,0,0.05);">
+    <h3 style="color:#10b981; margin:0;">👨‍💼 พนักงานลูกจ้าง (Employee)</h3>
+    <span class="status-badge" style="background:#d1fae5; color:#10b981; padding: 2px 10px; border-radius: 10px; font-weight: bold; font-size: 0.8rem;">100+ XP</span>
+    <hr style="margin: 10px 0;">
+    <h4 style="margin:0;">⏰ สิทธิ์ Time Extension (ขยายเวลา)</h4>
+    <p style="margin-top:5px;">ส่งงานล่าช้ากว่ากำหนดได้เพิ่มอีก 1 สัปดาห์ โดยไม่ถูกหักคะแนนครึ่งหนึ่งของงานนั้น หรือคะแนนความรับผิดชอบ จิตพิสัย (ใช้ได้กับทุกงานหลังจากสอบกลางภาค)</p>
+    <div style="background-color: #f1f5f9; padding: 10px; border-radius: 8px; font-weight: 600; color: #334155; margin-top: 10px; border-left: 4px solid #10b981;">
+        💪 มีอำนาจเหนือ "เวลา" - ไม่ต้องกังวลเรื่องส่งงานตรงเวลา
+    </div>
+    <p style="margin-top:10px; color:grey; font-size:0.9rem;">➡️ อีก 200 XP เพื่อเลื่อนยศเป็น หัวหน้าแผนก</p>
+</div>
+""",
+    # 3. Manager
+    """
+<div class="rank-detail-card" style="border-left: 6px solid #3b82f6; padding: 20px; background: white; border-radius: 15px; margin-bottom: 20px; box-shadow: 0 4px 6px rgba(0,0,0,0.05);">
+    <h3 style="color:#3b82f6; margin:0;">👔 หัวหน้าแผนก (Manager)</h3>
+    <span class="status-badge" style="background:#dbeafe; color:#3b82f6; padding: 2px 10px; border-radius: 10px; font-weight: bold; font-size: 0.8rem;">300+ XP</span>
+    <hr style="margin: 10px 0;">
+    <h4 style="margin:0;">🔄 สิทธิ์ Second Chance (โอกาสครั้งที่สอง)</h4>
+    <p style="margin-top:5px;">หากทำคะแนนสอบย่อย (Quiz) หรือใบงานได้น้อย สามารถขอ "สอบแก้ตัว" หรือ "ทำใบงานชุดเดิมใหม่" เพื่อปรับคะแนนให้ดีขึ้นได้ โดยยังได้คะแนนเต็มอยู่เหมือนเดิม</p>
+    <div style="background-color: #f1f5f9; padding: 10px; border-radius: 8px; font-weight: 600; color: #334155; margin-top: 10px; border-left: 4px solid #3b82f6;">
+        💪 มีอำนาจเหนือ "ความผิดพลาด" - พลาดแล้วยังแก้ไขได้
+    </div>
+    <p style="margin-top:10px; color:grey; font-size:0.9rem;">➡️ อีก 300 XP เพื่อเลื่อนยศเป็น หัวหน้าฝ่าย</p>
+</div>
+""",
+    # 4. Director
+    """
+<div class="rank-detail-card" style="border-left: 6px solid #8b5cf6; padding: 20px; background: white; border-radius: 15px; margin-bottom: 20px; box-shadow: 0 4px 6px rgba(0,0,0,0.05);">
+    <h3 style="color:#8b5cf6; margin:0;">💼 หัวหน้าฝ่าย (Director)</h3>
+    <span class="status-badge" style="background:#f3e8ff; color:#8b5cf6; padding: 2px 10px; border-radius: 10px; font-weight: bold; font-size: 0.8rem;">600+ XP</span>
+    <hr style="margin: 10px 0;">
+    <h4 style="margin:0;">✂️ สิทธิ์ Workload Cut (ลดภาระงาน 50%)</h4>
+    <p style="margin-top:5px;">ในใบงานที่มีโจทย์เยอะ (เช่น 10 ข้อ) ได้รับอนุญาตให้ทำ "เพียงครึ่งเดียว" (เช่น ทำเฉพาะข้อคู่ 5 ข้อ) แต่ครูจะกรอกคะแนนให้เสมือนว่าทำมาครบถ้วน</p>
+    <div style="background-color: #f1f5f9; padding: 10px; border-radius: 8px; font-weight: 600; color: #334155; margin-top: 10px; border-left: 4px solid #8b5cf6;">
+        💪 มีอำนาจเหนือ "ปริมาณงาน" - ทำงานน้อยกว่าครึ่งหนึ่ง แต่ได้ผลลัพธ์เท่ากัน
+    </div>
+    <p style="margin-top:10px; color:grey; font-size:0.9rem;">➡️ อีก 400 XP เพื่อเลื่อนยศเป็น ประธาน</p>
+</div>
+""",
+    # 5. President
+    """
+<div class="rank-detail-card" style="border-left: 6px solid #f59e0b; padding: 20px; background: white; border-radius: 15px; margin-bottom: 20px; box-shadow: 0 4px 6px rgba(0,0,0,0.05);">
+    <h3 style="color:#f59e0b; margin:0;">👑 ประธาน (President)</h3>
+    <span class="status-badge" style="background:#fef3c7; color:#f59e0b; padding: 2px 10px; border-radius: 10px; font-weight: bold; font-size: 0.8rem;">1000+ XP</span>
+    <span style="margin-left:10px; font-size:0.8rem; color:#f59e0b;">⭐ ยศสูงสุด</span>
+    <hr style="margin: 10px 0;">
+    <h4 style="margin:0;">🛡️ สิทธิ์ Immunity & Bonus (ภูมิคุ้มกันและโบนัส)</h4>
+    <p style="margin-top:5px;">สามารถเลือกไม่ทำ 3 งาน โดยครูจะยังให้คะแนนเต็มกับงานที่เลือกไม่ทำ + ได้รับคะแนนพิเศษ +1 คะแนนฟรีๆ ในทุกงานที่ส่ง (งานหลังกลางภาค)</p>
+    <div style="background-color: #f1f5f9; padding: 10px; border-radius: 8px; font-weight: 600; color: #334155; margin-top: 10px; border-left: 4px solid #f59e0b;">
+        💪 มีอำนาจเหนือ "กฎเกณฑ์" - ลบประวัติเสียได้ และได้คะแนนมาฟรี
+    </div>
+</div>
+""",
+]
+RANK_INFO_HTML = "".join(_minify_html(c) for c in RANK_CARDS)
@@ -0,0 +1,1170 @@
+# ==============================================================================
+# STORAGE BACKENDS (เลือกด้วย env STORAGE_BACKEND: gsheets | sqlite)
+# ==============================================================================
+import os
+import time
+import json
+import uuid
+import sqlite3
+import threading
+import atexit
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import perf
+from gamification import BadgeEngine, STATS
+
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "gsheets")
+SQLITE_PATH = os.environ.get("SQLITE_PATH", "classroom.db")
+
+COLS = ['Room', 'GroupName', 'XP', 'Members', 'LastUpdated', 'Badges', 'Rev'] # Rev: เลขรุ่นของแถว (ใช้ตรวจว่ามีคนอื่นเขียนแทรก)
+LEDGER_COLS = ['EventId', 'Room', 'GroupName', 'Ts', 'Reason', 'Amount']
+# ชื่อคอลัมน์แบบเดียวกับ HistoryLog เดิม (ใช้ใน Recent / Power Editor)
+EVENT_FIELDS = {'EventId': 'id', 'Ts': 'ts', 'Reason': 'reason', 'Amount': 'amount', 'Balance': 'balance'}
+
+# บีบอัดประวัติ: กลุ่มที่มี event เกิน COMPACT_THRESHOLD แถว พับแถวเก่าเหลือ checkpoint แถวเดียว + COMPACT_KEEP แถวล่าสุด
+COMPACT_THRESHOLD = 1000
+COMPACT_KEEP = 200
+
+# ------------------------------------------------------------------------------
+# ROOM MODEL: แปลงข้อมูลของห้องครั้งเดียวต่อ version (Badges เป็น tuple จากสถิติ, เวลาเป็น datetime64)
+# แล้ว Recent / Power Editor / Rankings / กราฟ อ่านจากตรงนี้ร่วมกัน JSON ของ Badges สร้างตอนเขียนเท่านั้น ไม่ถูกอ่านกลับ
+# ------------------------------------------------------------------------------
+ROOM_CACHE_SIZE = 16 # แคชร่วมทุก session ตาม (ที่เก็บ, ห้อง) โมเดลรู้ version ของตัวเอง
+TIMELINE_COLS = ['Group', 'Timestamp', 'Score', 'Reason', 'Change']
+_rooms = OrderedDict()
+_rooms_lock = threading.Lock()
+
+class GroupRecord:
+    """กลุ่มหนึ่งใน snapshot: event ของกลุ่มเป็น array เรียงเก่าสุดก่อน"""
+    __slots__ = ('room', 'name', 'members', 'xp', 'badges', 'ids', 'ts', 'reasons', 'amounts', 'balances')
+
+    def __init__(self, room, name, members, xp, badges, ids, ts, reasons, amounts, balances):
+        self.room, self.name, self.members, self.xp, self.badges = room, name, members, xp, badges
+        self.ids, self.ts, self.reasons, self.amounts, self.balances = ids, ts, reasons, amounts, balances
+
+    def history(self, n=None):
+        """ประวัติแบบ HistoryLog เดิม (id, ts, reason, amount, balance) ใหม่สุดก่อน n รายการ"""
+        last = slice(None, None, -1) if n is None else slice(-1, -min(n, len(self.ids)) - 1, -1)
+        return pd.DataFrame({
+            'id': self.ids[last],
+            'ts': pd.DatetimeIndex(self.ts[last]).strftime("%Y-%m-%d %H:%M:%S"),
+            'reason': self.reasons[last],
+            'amount': self.amounts[last],
+            'balance': self.balances[last],
+        })
+
+class RoomModel:
+    """ทุกกลุ่มของห้อง ณ version หนึ่ง (groups เรียงตามแถวใน Sheet1)
+
+    mark: ตำแหน่งใน Ledger ที่โมเดลนี้รวมไว้แล้ว (ที่เก็บใช้หา event ที่ต่อท้ายหลังจากนั้น) None = ต่อเพิ่มไม่ได้
+    """
+    __slots__ = ('room', 'groups', 'group', 'ts', 'reasons', 'amounts', 'balances', '_timeline', 'version', 'mark')
+
+    def __init__(self, room, df, ev, badges):
+        # ev: event ของห้องเรียงเก่าสุดก่อน แปลงเวลาทั้งห้องด้วย to_datetime ครั้งเดียว
+        # badges: Series จาก Store.badges() (index = GroupName)
+        self.room = room
+        self.group = ev['GroupName'].to_numpy()
+        self.ts = pd.to_datetime(ev['Ts'].to_numpy(), errors='coerce').to_numpy()
+        self.reasons = ev['Reason'].to_numpy()
+        self.amounts = ev['Amount'].to_numpy(dtype=int)
+        self.balances = ev['Balance'].to_numpy(dtype=int)
+        ids = ev['EventId'].to_numpy()
+        pos = ev.groupby('GroupName', sort=False).indices if len(ev) else {}
+        none = np.array([], dtype=int)
+        badges = dict(zip(badges.index, badges))
+        self.groups = {}
+        for name, members, xp in zip(df['GroupName'], df['Members'], df['XP']):
+            ix = pos.get(name, none)
+            self.groups[name] = GroupRecord(room, name, members, int(xp), tuple(badges.get(name, ())),
+                                            ids[ix], self.ts[ix], self.reasons[ix], self.amounts[ix], self.balances[ix])
+        self._timeline = None
+        self.version = self.mark = None
+
+    def extended(self, events, groups):
+        """โมเดลใหม่ = โมเดลนี้ + events (dict แบบ Ledger + Balance เรียงเก่าสุดก่อน) โมเดลเดิมไม่ถูกแก้
+
+        groups = {GroupName: (XP, badges)} ของกลุ่มที่มี event ใหม่ กลุ่มอื่นใช้ GroupRecord เดิมร่วมกัน
+        """
+        m = RoomModel.__new__(RoomModel)
+        grp = np.array([e['GroupName'] for e in events], dtype=object)
+        ids = np.array([e['EventId'] for e in events], dtype=object)
+        ts = pd.to_datetime([e['Ts'] for e in events], errors='coerce').to_numpy()
+        reasons = np.array([e['Reason'] for e in events], dtype=object)
+        amounts = np.fromiter((e['Amount'] for e in events), dtype=int, count=len(events))
+        balances = np.fromiter((e['Balance'] for e in events), dtype=int, count=len(events))
+        m.room = self.room
+        m.group = np.concatenate([self.group, grp])
+        m.ts = np.concatenate([self.ts, ts])
+        m.reasons = np.concatenate([self.reasons, reasons])
+        m.amounts = np.concatenate([self.amounts, amounts])
+        m.balances = np.concatenate([self.balances, balances])
+        m.groups = dict(self.groups)
+        for name, (xp, badges) in groups.items():
+            rec, ix = self.groups[name], grp == name
+            m.groups[name] = GroupRecord(self.room, name, rec.members, xp, badges,
+                                         np.concatenate([rec.ids, ids[ix]]), np.concatenate([rec.ts, ts[ix]]),
+                                         np.concatenate([rec.reasons, reasons[ix]]), np.concatenate([rec.amounts, amounts[ix]]),
+                                         np.concatenate([rec.balances, balances[ix]]))
+        m._timeline = None
+        m.version = m.mark = None
+        return m
+
+    def timeline(self):
+        """ประวัติทุกกลุ่ม (TIMELINE_COLS) เรียงตามเวลา สร้างครั้งแรกที่ใช้ (ผลลัพธ์ใช้ร่วมกัน ห้ามแก้ในที่)"""
+        if self._timeline is None:
+            ok = ~np.isnat(self.ts)
+            self._timeline = pd.DataFrame({
+                'Group': self.group[ok],
+                'Timestamp': self.ts[ok],
+                'Score': self.balances[ok], # ใช้ balance ณ ตอนนั้น
+                'Reason': self.reasons[ok],
+                'Change': self.amounts[ok],
+            }, columns=TIMELINE_COLS)
+        return self._timeline
+
+class Store(ABC):
+    """สิ่งที่ UI ใช้จาก storage ทุกแบบ (backend ที่ขาดเมธอดไหนจะสร้าง instance ไม่ได้ตั้งแต่แรก)
+
+    fetch() คืน DataFrame คอลัมน์ COLS, events() คืน LEDGER_COLS + Balance เรียงใหม่สุดก่อน (room=None คือทุกห้อง)
+    """
+    cols = COLS
+    source = None # ชื่อที่เก็บ (ใช้แยก key ของแคช)
+    epoch = None # ที่เก็บที่ต่อ RoomModel เดิมได้: เลขรุ่นที่เปลี่ยนเมื่อข้อมูลเปลี่ยนแบบอื่นที่ไม่ใช่ต่อท้าย Ledger
+    writer = None # WriteBehind ถ้าที่เก็บนี้เขียนเบื้องหลัง (None = เขียนเสร็จก่อนคืนค่า)
+
+    @property
+    @abstractmethod
+    def version(self):
+        """เปลี่ยนทุกครั้งที่ข้อมูลเปลี่ยน (ใช้เป็น key ของแคชฝั่ง UI)"""
+
+    @abstractmethod
+    def fetch(self): ...
+    @abstractmethod
+    def save(self, df): ...
+    @abstractmethod
+    def reset(self): ... # Repair: ล้างกลุ่ม + Ledger + สถิติ badge เหลือแต่หัวตาราง
+    @abstractmethod
+    def events(self, room, group=None): ...
+    @abstractmethod
+    def update_score(self, room, groups, amount, reason, engine): ...
+    @abstractmethod
+    def create(self, room, name, mem): ...
+    @abstractmethod
+    def delete(self, room, name): ...
+    @abstractmethod
+    def power_edit(self, room, name, new_hist_df, engine): ...
+    @abstractmethod
+    def badges(self, room, engine): ...
+    @abstractmethod
+    def compact(self, room, groups=None, before=None, keep=COMPACT_KEEP): ...
+
+    def status(self):
+        """(จำนวนรายการที่ยังไม่ถึงที่เก็บจริง, ข้อความ error ล่าสุด)"""
+        return 0, None
+
+    def _appended(self, room, mark):
+        """(events, {GroupName: (XP, badges)}, mark ใหม่) ที่ต่อท้ายห้องหลัง mark หรือ None = ต้องสร้างใหม่ทั้งห้อง"""
+        return None
+
+    def room(self, room):
+        """RoomModel ของห้อง (คิดใหม่เมื่อ version เปลี่ยนเท่านั้น)
+
+        ถ้าตั้งแต่โมเดลเดิมมีแค่ event ที่ต่อท้าย (_appended) จะต่อเข้าโมเดลเดิม ไม่ต้องกรอง/เรียง Ledger ทั้งก้อนใหม่
+        """
+        key = (self.source, room)
+        version = self.version
+        with _rooms_lock:
+            m = _rooms.get(key)
+            if m is not None: _rooms.move_to_end(key)
+        if m is not None and m.version == version: return m
+        new = None if m is None or m.mark is None else self._appended(room, m.mark)
+        with perf.span("room_model"):
+            if new is None:
+                epoch = self.epoch # อ่านก่อนข้อมูล: ถ้าข้อมูลใหม่กว่า ครั้งหน้าแค่สร้างใหม่อีกรอบ
+                df = self.fetch()
+                ev = self.events(room).iloc[::-1]
+                m = RoomModel(room, df[df['Room'] == room], ev, self.badges(room, BadgeEngine()))
+                if epoch is not None: m.mark = (epoch, int(ev.index.max()) if len(ev) else 0)
+            elif new[0]:
+                events, groups, mark = new
+                m = m.extended(events, groups)
+                m.mark = mark
+        m.version = version
+        with _rooms_lock:
+            _rooms[key] = m
+            while len(_rooms) > ROOM_CACHE_SIZE: _rooms.popitem(last=False)
+        return m
+
+    def history(self, room, group, n=None):
+        """ประวัติของกลุ่มในรูปแบบเดียวกับ HistoryLog เดิม (id, ts, reason, amount, balance) ใหม่สุดก่อน"""
+        rec = self.room(room).groups.get(group)
+        if rec is None: return pd.DataFrame(columns=list(EVENT_FIELDS.values()))
+        return rec.history(n)
+
+    def timeline(self, room):
+        """ประวัติทุกกลุ่มในห้องสำหรับกราฟ (TIMELINE_COLS) เรียงตามเวลา"""
+        return self.room(room).timeline()
+
+    @staticmethod
+    def _badges(raw):
+        perf.count("json_parses")
+        try: return json.loads(raw)
+        except: return []
+
+    @staticmethod
+    def _fold(ev, before=None, keep=COMPACT_KEEP):
+        """พับ event เก่าของกลุ่มเดียว (เรียงตามเวลา) เป็น checkpoint
+
+        พับแถวที่ Ts < before (ถ้าระบุ) หรือทุกแถวยกเว้น keep แถวล่าสุด
+        คืน (checkpoint, จำนวนแถวที่พับ, แถวที่ย้ายไป archive) หรือ None ถ้าไม่มีอะไรให้พับ
+        """
+        n = len(ev) - keep if before is None else int((ev['Ts'] < before).sum())
+        if n < 2: return None
+        old = ev.iloc[:n]
+        s = BadgeEngine.stats_from_events(old).iloc[0]
+        ck = {"EventId": BadgeEngine.checkpoint_id(s), "Room": old['Room'].iloc[0], "GroupName": old['GroupName'].iloc[0],
+              "Ts": old['Ts'].iloc[-1], "Reason": f"📦 ยอดยกมา ({int(s['events'])} รายการ)", "Amount": int(s['balance'])}
+        # checkpoint เดิมที่ถูกพับซ้ำไม่ต้องเก็บ (รายละเอียดของมันอยู่ใน archive แล้ว)
+        return ck, n, old[~BadgeEngine.is_checkpoint(old['EventId'])]
+
+    @staticmethod
+    def _edited(room, name, new_hist_df):
+        """แปลงตารางจาก Power Editor เป็น event (เรียงตามเวลา) + XP รวม + สถิติ badge"""
+        # Convert DF back to list (แถวที่เพิ่มใหม่ใน editor อาจไม่มี id/ts)
+        hist_list = new_hist_df.to_dict('records')
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        for h in hist_list:
+            if not isinstance(h.get('id'), str) or not h['id']: h['id'] = str(uuid.uuid4())[:8]
+            if not isinstance(h.get('ts'), str) or not h['ts']: h['ts'] = now
+            if not isinstance(h.get('reason'), str): h['reason'] = ""
+        
+        # Recalc total
+        total = sum(int(x['amount']) for x in hist_list)
+        
+        # ตารางเรียงใหม่สุดก่อน: กลับด้านก่อน sort เวลาเท่ากันจึงคงลำดับเดิม (checkpoint อยู่ก่อน event ที่ตามมา)
+        sorted_h = sorted(hist_list[::-1], key=lambda x: x['ts'])
+        events = [{"EventId": h['id'], "Room": room, "GroupName": name,
+                   "Ts": h['ts'], "Reason": h['reason'], "Amount": int(h['amount'])} for h in sorted_h]
+        # สถิติ badge ของประวัติชุดใหม่ (คิดครั้งเดียวตอนแก้ประวัติ)
+        stats = BadgeEngine.stats_from_events(pd.DataFrame(events, columns=LEDGER_COLS))
+        stats = stats.iloc[0].to_dict() if len(stats) else BadgeEngine.new_stats()
+        return events, total, stats
+
+# ------------------------------------------------------------------------------
+# Google Sheets
+# ------------------------------------------------------------------------------
+def _not_found(e):
+    """worksheet ไม่มีอยู่จริง (ต่างจากอ่านไม่สำเร็จชั่วคราว เช่น 429 / timeout)"""
+    try: from gspread.exceptions import WorksheetNotFound
+    except ImportError: return False
+    return isinstance(e, WorksheetNotFound)
+
+# snapshot ของ Sheet1 + Ledger ที่ทุก session ใน process ใช้ร่วมกัน (app.py ถูกรันใหม่ทุก rerun จึงต้องเก็บผ่าน cache_resource)
+SNAPSHOT_MAX_AGE = 300 # วินาที: เผื่อมีคนแก้ชีตตรง ๆ นอกแอป
+APPEND_LOG_MAX = 2000 # event ที่ต่อท้ายห้องเดียวที่จำไว้ต่อ RoomModel (เกินนี้เริ่ม epoch ใหม่)
+SHEET = "Sheet1"
+LEDGER = "Ledger" # สมุดบัญชีคะแนนแบบ append-only (แทนคอลัมน์ HistoryLog เดิม)
+ARCHIVE = "LedgerArchive" # event เก่าที่ถูกพับเป็น checkpoint แล้ว (ไม่ถูกอ่านตอนใช้งานปกติ)
+
+class SnapshotCache:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.df = None # index = เลขแถวในชีต (แถว 1 คือหัวตาราง)
+        self.rows = {} # (Room, GroupName) -> เลขแถวใน df (สร้างใหม่เมื่อชุดกลุ่มเปลี่ยนเท่านั้น)
+        self.ledger = None # index = เลขแถวในชีต Ledger + คอลัมน์ Balance ที่คำนวณเอง
+        self.pending = [] # (เลขแถว, event) ที่ให้คะแนนแล้วแต่ยังไม่ได้ต่อเข้า ledger (ต่อเมื่อมีคนต้องใช้ทั้งก้อน)
+        self.appended = {} # Room -> [(เลขแถว, event)] ที่ต่อท้ายตั้งแต่ epoch นี้ (ใช้ต่อ RoomModel เดิม)
+        self.epoch = 0 # เพิ่มเมื่อข้อมูลเปลี่ยนแบบอื่นที่ไม่ใช่ให้คะแนน (เลขแถว/ยอดของกลุ่มอาจไม่ตรงกับที่เคยเห็น)
+        self.stats = {} # (Room, GroupName) -> สถิติ badge (คิดจาก Ledger ตอนโหลด แล้วอัปเดตทีละ event)
+        self.loaded_at = 0.0
+        self.version = 0 # เพิ่มทุกครั้งที่ข้อมูลเปลี่ยน (save หรืออ่านชีตใหม่)
+        self.sheet_version = 0 # เพิ่มเมื่อ Sheet1 เปลี่ยน (เลขแถวใน df รุ่นเก่าอาจไม่ตรงแล้ว)
+        self.header_ok = {} # worksheet -> หัวตารางเรียงตามที่คาดไว้หรือไม่ (ถ้าไม่ เขียนรายแถวไม่ได้)
+        self.ws = {} # worksheet -> gspread Worksheet สำหรับเขียนรายแถว (False = ใช้ไม่ได้)
+
+@st.cache_resource
+def shared_snapshot():
+    return SnapshotCache()
+
+WRITE_DELAY = 0.5 # วินาที: รอคลิกที่ตามมาติด ๆ แล้วเขียนชีตรวมครั้งเดียว
+RETRY_DELAY = 5
+
+class WriteBehind:
+    """คิวเขียนชีตเบื้องหลัง: ให้คะแนนแก้ snapshot ทันที แล้ว thread นี้ค่อยรวมหลายคลิกเขียนชีตทีเดียว
+
+    ลำดับ lock: io ก่อน cache.lock เสมอ
+    """
+    def __init__(self, cache):
+        self.cache = cache
+        self.io = threading.RLock() # ถือตลอดการเขียนชีต งานที่เลื่อนเลขแถวต้องรอคิวว่างก่อน
+        self.keys = {} # (Room, GroupName) -> XP ที่เพิ่มแต่ยังไม่ได้เขียน (None = เขียนทับทั้งแถว เช่น Power Editor)
+        self.events = [] # event ที่ยังไม่ได้ต่อท้าย Ledger
+        self.grown = set() # กลุ่มที่มี event ใหม่ (ตรวจว่าถึงเวลาบีบอัดประวัติหรือยัง หลังเขียนเสร็จ)
+        self.db = None # DataManager ล่าสุด (ใช้ connection ของมัน)
+        self.error = None
+        self.synced_at = None
+        self.wake = threading.Event()
+        threading.Thread(target=self._run, daemon=True).start()
+        atexit.register(self.drain)
+
+    @property
+    def pending(self):
+        # จำนวนรายการที่รอ (Power Editor เข้าคิวเฉพาะแถวโดยไม่มี event)
+        return max(len(self.events), len(self.keys))
+
+    def push(self, db, keys, events):
+        """เข้าคิว (เรียกขณะถือ cache.lock หลังแก้ snapshot แล้ว) keys = {(Room, GroupName): XP ที่เพิ่ม/None}"""
+        self.db = db
+        self._merge(keys)
+        self.events.extend(events)
+        self.wake.set()
+
+    def _merge(self, keys):
+        for k, d in keys.items():
+            old = self.keys.get(k, 0)
+            self.keys[k] = None if d is None or old is None else old + d
+
+    def _run(self):
+        while True:
+            self.wake.wait()
+            time.sleep(WRITE_DELAY)
+            self.wake.clear()
+            try:
+                self.drain()
+                with self.cache.lock: grown, self.grown = self.grown, set()
+                if grown: self.db._compact_due(grown)
+            except Exception as e:
+                self.error = str(e)
+                time.sleep(RETRY_DELAY)
+                self.wake.set()
+
+    def drain(self):
+        """เขียนทุกอย่างที่ค้างลงชีตตอนนี้เลย (ถ้าเขียนไม่ได้ ของที่ค้างยังอยู่ในคิว)"""
+        with self.io:
+            c = self.cache
+            with c.lock:
+                events, self.events = self.events, []
+                self.grown.update((e['Room'], e['GroupName']) for e in events)
+            if events:
+                try:
+                    with perf.span("write_events"): self.db._push_events(events)
+                except Exception:
+                    with c.lock: self.events[:0] = events
+                    raise
+            with c.lock:
+                keys, self.keys = self.keys, {}
+            if keys:
+                try:
+                    with perf.span("write_rows"): self.db._push_rows(keys)
+                except Exception:
+                    with c.lock: self._merge(keys)
+                    raise
+            if events or keys:
+                self.error = None
+                self.synced_at = time.time()
+
+@st.cache_resource
+def shared_writer():
+    return WriteBehind(shared_snapshot())
+
+class SheetsStore(Store):
+    """Google Sheets: Sheet1 (สรุปรายกลุ่ม) + Ledger ผ่าน st-gsheets-connection"""
+    def __init__(self, conn=None):
+        """conn: connection ที่มี read/update/create (+ client) แบบ GSheetsConnection ถ้าระบุจะใช้ snapshot/คิวของตัวเอง"""
+        try:
+            if conn is None:
+                # gspread/google-auth โหลดเฉพาะตอนใช้ backend นี้จริง
+                from streamlit_gsheets import GSheetsConnection
+                self.conn = st.connection("gsheets", type=GSheetsConnection)
+                self.cache = shared_snapshot()
+                self.writer = shared_writer()
+            else: # เช่น benchmark ที่ใช้ชีตจำลอง
+                self.conn = conn
+                self.cache = SnapshotCache()
+                self.writer = WriteBehind(self.cache)
+        except Exception as e:
+            st.error(f"DB Connect Error: {e}")
+            st.stop()
+        self.source = ("gsheets", id(self.cache))
+
+    @property
+    def version(self):
+        return self.cache.version
+
+    @property
+    def epoch(self):
+        return self.cache.epoch
+
+    def status(self):
+        return self.writer.pending, self.writer.error
+
+    def _read(self):
+        raw = self._get(SHEET)
+        self.cache.ledger = led = self._read_ledger(raw)
+        self.cache.pending = [] # ชีตมีครบแล้ว (drain ก่อนอ่านเสมอ)
+        self.cache.stats = BadgeEngine.stats_from_events(led.sort_values('Ts', kind='stable')).to_dict('index')
+        return self._frame(raw)
+
+    def _get(self, name):
+        """อ่านทั้งชีต (นับขนาดไว้ในแผง Performance)"""
+        raw = self.conn.read(worksheet=name, ttl=0)
+        perf.count("bytes_read", perf.frame_bytes(raw))
+        return raw
+
+    def _frame(self, raw):
+        self.cache.header_ok[SHEET] = list(raw.columns[:len(self.cols)]) == self.cols
+        if 'Rev' not in raw.columns and not raw.empty: raw['Rev'] = 0 # ชีตเดิมก่อนมีคอลัมน์ Rev
+        if raw.empty or not set(self.cols).issubset(raw.columns):
+            return pd.DataFrame(columns=self.cols)
+        # แถวที่ i ของชีต (นับหัวตารางเป็นแถว 1) = index i
+        raw.index = pd.RangeIndex(2, len(raw) + 2)
+        df = raw[self.cols].copy().dropna(how='all')
+        for c in ['Room', 'GroupName']: df[c] = df[c].astype(str)
+        for c in ['XP', 'Rev']: df[c] = pd.to_numeric(df[c], errors='coerce').fillna(0).astype(int)
+        df['Badges'] = df['Badges'].fillna("[]").astype(str)
+        return df
+
+    def _reload(self):
+        # เรียกขณะถือ _exclusive
+        c = self.cache
+        c.df = self._read()
+        c.rows = self._index(c.df)
+        c.sheet_version += 1
+        self._bump()
+
+    def _read_ledger(self, raw):
+        try:
+            led = self._get(LEDGER)
+            self.cache.header_ok[LEDGER] = list(led.columns[:len(LEDGER_COLS)]) == LEDGER_COLS
+            led.index = pd.RangeIndex(2, len(led) + 2)
+        except Exception as e:
+            # error อื่น (quota / timeout) ส่งต่อ fetch() จะใช้ snapshot เดิม ห้ามเขียนทับ Ledger
+            if not _not_found(e): raise
+            # ยังไม่มีชีต Ledger: สร้างใหม่ (ย้ายประวัติจากคอลัมน์ HistoryLog เดิมมาครั้งเดียว ถ้ามี)
+            hist = self._history_to_ledger(raw) if 'HistoryLog' in raw.columns else pd.DataFrame(columns=LEDGER_COLS)
+            led = self._overwrite(LEDGER, hist, LEDGER_COLS)
+        if led.empty or not set(LEDGER_COLS).issubset(led.columns):
+            led = pd.DataFrame(columns=LEDGER_COLS)
+        led = led[LEDGER_COLS].dropna(how='all').copy()
+        for c in ['EventId', 'Room', 'GroupName', 'Ts', 'Reason']: led[c] = led[c].fillna("").astype(str)
+        led['Amount'] = pd.to_numeric(led['Amount'], errors='coerce').fillna(0).astype(int)
+        return self._with_balance(led)
+
+    def _history_to_ledger(self, raw):
+        # แปลง JSON ทุกแถวก่อน แล้วสร้างตารางจากคอลัมน์ทีเดียว (ไม่ต่อ dict ทีละ event)
+        logs = []
+        if 'HistoryLog' in raw.columns:
+            for room, grp, log in zip(raw['Room'], raw['GroupName'], raw['HistoryLog']):
+                perf.count("json_parses")
+                try: hist = json.loads(log)
+                except: continue
+                if isinstance(hist, list) and hist: logs.append((str(room), str(grp), hist[::-1])) # HistoryLog เก็บใหม่สุดไว้ก่อน
+        n = [len(h) for _, _, h in logs]
+        flat = [e for _, _, h in logs for e in h]
+        led = pd.DataFrame({
+            "EventId": [e.get('id') or str(uuid.uuid4())[:8] for e in flat],
+            "Room": np.repeat([r for r, _, _ in logs], n).astype(object),
+            "GroupName": np.repeat([g for _, g, _ in logs], n).astype(object),
+            "Ts": [e['ts'] for e in flat],
+            "Reason": [e['reason'] for e in flat],
+            "Amount": np.fromiter((int(e['amount']) for e in flat), dtype=int, count=len(flat)),
+        }, columns=LEDGER_COLS)
+        return led.sort_values('Ts', kind='stable')
+
+    @staticmethod
+    def _with_balance(led):
+        """Balance = ยอดสะสมของกลุ่ม ณ event นั้น (เรียงตามเวลา เวลาเท่ากันใช้ลำดับในชีต)"""
+        led['Balance'] = led.sort_values('Ts', kind='stable').groupby(['Room', 'GroupName'])['Amount'].cumsum()
+        led['Balance'] = led['Balance'].fillna(0).astype(int)
+        return led
+
+    def _bump(self, appended=False):
+        """version ใหม่ appended=True คือแค่ต่อ event ท้าย Ledger (RoomModel เดิมต่อเพิ่มได้) ไม่งั้นขึ้น epoch ใหม่"""
+        c = self.cache
+        c.loaded_at = time.time()
+        c.version += 1
+        if not appended:
+            self._ledger()
+            c.appended = {}
+            c.epoch += 1
+
+    def _ledger(self):
+        """Ledger ทั้งก้อน (ต่อ event ที่ค้างใน pending เข้าไปก่อน) เรียกขณะถือ cache.lock"""
+        c = self.cache
+        if c.pending:
+            rows, events = zip(*c.pending)
+            c.ledger = pd.concat([c.ledger, pd.DataFrame(list(events), index=list(rows))])
+            c.pending = []
+        return c.ledger
+
+    @staticmethod
+    def _index(df):
+        return dict(zip(zip(df['Room'], df['GroupName']), df.index))
+
+    def _publish(self, df, reindex=True):
+        # write-through: rerun ถัดไปได้ข้อมูลใหม่โดยไม่ต้องอ่านชีต (เรียกขณะถือ lock)
+        # reindex=False เมื่อแก้แค่ค่าในแถวเดิม (ชุด Room/GroupName ไม่เปลี่ยน)
+        c = self.cache
+        c.df = df.copy()
+        if reindex: c.rows = self._index(c.df)
+        c.sheet_version += 1
+        self._bump()
+        df.attrs['version'] = c.sheet_version
+
+    def fetch(self):
+        """คืนสำเนาของ snapshot ล่าสุด อ่านจากชีตเฉพาะตอนยังไม่มี/หมดอายุ
+
+        df.attrs['version'] บอกว่าสำเนานี้มาจาก Sheet1 รุ่นไหน
+        """
+        c = self.cache
+        if c.df is None or time.time() - c.loaded_at > SNAPSHOT_MAX_AGE:
+            with self.writer.io, c.lock:
+                if c.df is None or time.time() - c.loaded_at > SNAPSHOT_MAX_AGE:
+                    try:
+                        self.writer.drain() # ของที่ค้างในคิวต้องถึงชีตก่อนอ่านใหม่
+                        with perf.span("fetch"): self._reload()
+                        self.writer.error = None
+                    except Exception as e:
+                        # ชีตใช้ไม่ได้ชั่วคราว: ใช้ snapshot เดิมต่อ (แจ้งผ่าน status()) แล้วลองอ่านใหม่อีก RETRY_DELAY วินาที
+                        self.writer.error = str(e)
+                        c.loaded_at = time.time() - SNAPSHOT_MAX_AGE + RETRY_DELAY
+        with c.lock:
+            if c.df is None: return pd.DataFrame(columns=self.cols)
+            out = c.df.copy()
+            out.attrs['version'] = c.sheet_version
+            return out
+
+    def rows(self, room, groups):
+        """เลขแถวของกลุ่มใน snapshot (ข้ามกลุ่มที่ไม่มี) ไม่ต้องไล่ทั้งตารางทีละกลุ่ม"""
+        idx = self.cache.rows
+        return [idx[(room, g)] for g in groups if (room, g) in idx]
+
+    @contextmanager
+    def _exclusive(self, reload=False):
+        """งานที่เลื่อนเลขแถว (เพิ่ม/ลบ/แทนที่): เขียนคิวที่ค้างให้หมด แล้วกันคลิกใหม่ไว้จนเสร็จ
+
+        reload=True อ่านชีตใหม่ก่อน (แอปอีก instance อาจเพิ่ม/ลบแถวไปแล้ว เลขแถวใน snapshot จะไม่ตรง)
+        """
+        with self.writer.io, self.cache.lock:
+            self.writer.drain()
+            if reload: self._reload()
+            yield
+
+    def events(self, room, group=None):
+        """event ใน Ledger ของห้อง (หรือเฉพาะกลุ่ม, room=None คือทุกห้อง) เรียงใหม่สุดก่อน"""
+        if self.cache.ledger is None: self.fetch()
+        with self.cache.lock:
+            led = self.cache.ledger
+            if led is None: return pd.DataFrame(columns=LEDGER_COLS + ['Balance'])
+            led = self._ledger()
+        if room is not None:
+            mask = led['Room'] == room
+            if group is not None: mask &= led['GroupName'] == group
+            led = led[mask]
+        return led.iloc[::-1].sort_values('Ts', ascending=False, kind='stable')
+
+    def _appended(self, room, mark):
+        """event ที่ update_score ต่อท้ายห้องนี้หลัง mark = (epoch, เลขแถวสุดท้ายที่โมเดลมี) ไล่จากท้าย appended เท่านั้น"""
+        c = self.cache
+        epoch, last = mark
+        engine = BadgeEngine()
+        with c.lock:
+            if epoch != c.epoch: return None
+            log = c.appended.get(room, [])
+            i = len(log)
+            while i and log[i - 1][0] > last: i -= 1
+            events = [e for _, e in log[i:]]
+            groups = {}
+            for g in {e['GroupName'] for e in events}:
+                xp = int(c.df.at[c.rows[(room, g)], 'XP'])
+                groups[g] = (xp, tuple(engine.evaluate(dict(c.stats.get((room, g), engine.new_stats()), balance=xp))))
+            return events, groups, (epoch, log[-1][0] if events else last)
+
+    def _overwrite(self, name, df, cols):
+        """เขียนทับทั้งชีต คืน df ที่เลขแถวตรงกับชีตแล้ว"""
+        out = df.reset_index(drop=True)
+        out.index += 2
+        perf.count("bytes_written", perf.frame_bytes(out[cols]))
+        try: self.conn.update(worksheet=name, data=out[cols])
+        except Exception as e:
+            if name == SHEET or not _not_found(e): raise
+            self.conn.create(worksheet=name, data=out[cols]) # ยังไม่มีชีตนี้
+        self.cache.header_ok[name] = True
+        return out
+
+    def save(self, df):
+        """เขียนทับทั้ง Sheet1 (ใช้กับ Repair หรือเมื่อเขียนรายแถวไม่ได้)"""
+        with self._exclusive(), perf.span("save"):
+            self._publish(self._overwrite(SHEET, df, self.cols))
+            self.writer.keys.clear()
+
+    def reset(self):
+        """Repair: เขียน Sheet1 + Ledger ใหม่เหลือแต่หัวตาราง (กลุ่มที่สร้างชื่อเดิมจะไม่ได้ประวัติ/badge เก่าคืน)
+
+        ชีต ARCHIVE ไม่ถูกแตะ
+        """
+        with self._exclusive(), perf.span("save"):
+            c = self.cache
+            self._publish(self._overwrite(SHEET, pd.DataFrame(columns=self.cols), self.cols))
+            c.ledger = self._with_balance(self._overwrite(LEDGER, pd.DataFrame(columns=LEDGER_COLS).astype({'Amount': int}), LEDGER_COLS))
+            c.stats = {}
+            self.writer.keys.clear()
+            self.writer.events.clear()
+            self.writer.grown.clear()
+
+    # --- เขียนเฉพาะแถวที่เปลี่ยน ---------------------------------------------
+    def _sheet(self, name=SHEET):
+        """Worksheet ของ gspread (มีเฉพาะ service account) ถ้าใช้ไม่ได้คืน None"""
+        c = self.cache
+        if c.ws.get(name) is None:
+            if not hasattr(getattr(self.conn, 'client', None), '_select_worksheet'):
+                c.ws[name] = False # ไม่มี service account: เขียนรายแถวไม่ได้ตลอดไป
+            else:
+                try: c.ws[name] = self.conn.client._select_worksheet(worksheet=name)
+                except Exception: return None # ล้มชั่วคราวหรือยังไม่มีชีต: ไม่จำไว้ ครั้งหน้าลองใหม่
+        return c.ws[name] or None
+
+    def _delta_ok(self, name=SHEET):
+        """เขียนรายแถวได้เมื่อหัวตารางตรงและมี worksheet (เลขแถวใน snapshot ตรงกับชีตเสมอ)
+
+        หัวตารางตรงแต่เปิด worksheet ไม่ได้ชั่วคราว: raise ให้คิวเก็บของไว้ลองใหม่ ไม่ถอยไปเขียนทับทั้งชีต
+        """
+        if not self.cache.header_ok.get(name): return False
+        if self._sheet(name) is not None: return True
+        if self.cache.ws.get(name) is False: return False
+        raise RuntimeError(f"เปิด worksheet {name} ไม่สำเร็จ")
+
+    def _cells(self, df, r, cols):
+        row = []
+        for v in df.loc[r, cols]:
+            if hasattr(v, 'item'): v = v.item()
+            row.append("" if pd.isna(v) else v)
+        return row
+
+    def _range(self, r, cols=None):
+        return f"A{r}:{chr(ord('A') + len(cols or self.cols) - 1)}{r}"
+
+    @staticmethod
+    def _delete_rows(ws, rows):
+        # ลบหลายแถวใน request เดียว เรียงจากล่างขึ้นบนเลขแถวที่ยังไม่ลบจึงไม่เลื่อน แถวติดกันรวมเป็นช่วงเดียว
+        spans = []
+        for r in sorted(set(rows), reverse=True):
+            if spans and spans[-1][0] == r + 1: spans[-1][0] = r
+            else: spans.append([r, r + 1])
+        reqs = [{"deleteDimension": {"range": {"sheetId": ws.id, "dimension": "ROWS", "startIndex": a - 1, "endIndex": b - 1}}}
+                for a, b in spans]
+        if reqs: ws.spreadsheet.batch_update({"requests": reqs})
+
+    @staticmethod
+    def _renumber(df, rows):
+        """df ที่ลบ rows ออกแล้ว เลื่อนเลขแถวที่อยู่ถัดไปขึ้นมา (เท่าจำนวนแถวที่ลบซึ่งอยู่ก่อนหน้า)"""
+        out = df.drop(index=rows)
+        gone = np.sort(np.asarray(rows, dtype=int))
+        idx = out.index.to_numpy()
+        out.index = idx - np.searchsorted(gone, idx)
+        return out
+
+    def _fresh(self, rows):
+        """ค่าปัจจุบันในชีตของแถวเหล่านี้ (อ่านรวม request เดียว)"""
+        got = self._sheet().batch_get([self._range(r) for r in rows], value_render_option="UNFORMATTED_VALUE")
+        return {r: dict(zip(self.cols, (v[0] if v else []))) for r, v in zip(rows, got)}
+
+    def _pending(self, k, d):
+        """XP ของกลุ่ม k ที่เรายังเขียนไม่ถึงชีต: รอบที่กำลังเขียน (d) + คลิกที่เข้าคิวตามมา"""
+        q = self.writer.keys.get(k, 0)
+        return None if d is None or q is None else d + q
+
+    def _rebase(self, r, cur, delta, mine):
+        """ตั้งแถว r ของ snapshot = ค่าในชีต (cur) + XP ที่เรายังเขียนไม่ถึง (delta) โดย mine คือแถวฝั่งเรา"""
+        df = self.cache.df
+        df.at[r, 'LastUpdated'] = mine['LastUpdated']
+        if delta is None: # เขียนทับทั้งแถว (Power Editor) คนล่าสุดชนะ
+            df.at[r, 'XP'], df.at[r, 'Badges'] = mine['XP'], mine['Badges']
+            return
+        xp = int(cur.get('XP') or 0) + delta
+        engine = BadgeEngine()
+        # badge ที่ได้แล้วไม่หายจากฝั่งโน้นยังอยู่ ส่วนที่เหลือคิดใหม่จากสถิติของเรา + XP ที่รวมแล้ว
+        stats = dict(self.cache.stats.get((mine['Room'], mine['GroupName']), engine.new_stats()), balance=xp)
+        badges = set(engine.evaluate(stats)) | (set(self._badges(cur.get('Badges'))) & engine.sticky)
+        df.at[r, 'XP'] = xp
+        df.at[r, 'Badges'] = json.dumps([b for b in engine.catalog if b in badges], ensure_ascii=False)
+        df.at[r, 'Members'] = cur.get('Members', mine['Members'])
+
+    def _push_rows(self, keys):
+        """(WriteBehind) เขียนแถวของกลุ่มที่ค้างแบบ compare-and-swap ด้วยคอลัมน์ Rev
+
+        อ่าน Rev ปัจจุบันของแถวที่จะเขียน ถ้าไม่ตรงกับที่เรารู้ (อีก instance เขียนไปแล้ว)
+        จะรวมเฉพาะแถวนั้นกับค่าในชีตก่อนเขียน ไม่ต้องล็อกทั้งชีต
+        """
+        c = self.cache
+        with c.lock:
+            if not self._delta_ok():
+                # หัวตารางไม่ตรง (เช่นชีตเดิมก่อนมีคอลัมน์ Rev) ต้องเขียนทั้งชีต: รวมกับค่าล่าสุดในชีตก่อน
+                # แล้วเพิ่ม Rev ของแถวเรา ไม่เขียนทับคะแนนที่ instance อื่นให้ไป
+                self._resync(keys)
+                for k in keys:
+                    if k in c.rows: c.df.at[c.rows[k], 'Rev'] += 1
+                self._publish(self._overwrite(SHEET, c.df, self.cols))
+                return
+            rows = {k: c.rows[k] for k in keys if k in c.rows}
+        if not rows: return
+        fresh = self._fresh(sorted(rows.values()))
+        with c.lock:
+            if any((str(fresh[r].get('Room')), str(fresh[r].get('GroupName'))) != k for k, r in rows.items()):
+                # แถวเลื่อน (อีก instance เพิ่ม/ลบกลุ่ม): อ่านใหม่ทั้งชีตแล้วบวกส่วนที่ยังไม่ได้เขียนกลับเข้าไป
+                self._resync(keys)
+                rows = {k: c.rows[k] for k in keys if k in c.rows}
+                fresh = None
+            data = []
+            rebased = False
+            for k, r in sorted(rows.items(), key=lambda kv: kv[1]):
+                if fresh is not None:
+                    rev = int(fresh[r].get('Rev') or 0)
+                    if rev != c.df.at[r, 'Rev']:
+                        self._rebase(r, fresh[r], self._pending(k, keys[k]), c.df.loc[r].copy())
+                        rebased = True
+                    c.df.at[r, 'Rev'] = rev
+                c.df.at[r, 'Rev'] += 1
+                data.append({"range": self._range(r), "values": [self._cells(c.df, r, self.cols)]})
+            if rebased: self._bump() # XP ของกลุ่มเปลี่ยนตามอีก instance: RoomModel ต้องสร้างใหม่
+        if data:
+            perf.count("bytes_written", perf.rows_bytes(d['values'][0] for d in data))
+            self._sheet().batch_update(data, value_input_option="USER_ENTERED")
+
+    def _resync(self, keys):
+        """อ่าน Sheet1 ใหม่ แล้วบวก XP ของเราที่ยังไม่ถึงชีต (ทั้งรอบนี้และที่เข้าคิวอยู่) กลับเข้าไป"""
+        c = self.cache
+        local, lrows = c.df, c.rows
+        c.df = self._frame(self._get(SHEET))
+        c.rows = self._index(c.df)
+        for k in set(keys) | set(self.writer.keys):
+            if k in c.rows and k in lrows: # กลุ่มที่อีก instance ลบไปแล้วก็ปล่อยไป
+                r = c.rows[k]
+                self._rebase(r, c.df.loc[r].to_dict(), self._pending(k, keys.get(k, 0)), local.loc[lrows[k]])
+        c.sheet_version += 1
+        self._bump()
+
+    def append(self, record):
+        """เพิ่มแถวใหม่ท้ายชีต"""
+        with self._exclusive():
+            c = self.cache
+            r = (int(c.df.index.max()) if len(c.df) else 1) + 1
+            out = pd.concat([c.df, pd.DataFrame([record], index=[r])[self.cols]])
+            if not self._delta_ok(): return self.save(out)
+            self._append(self._sheet(), [self._cells(out, r, self.cols)], "USER_ENTERED")
+            self._publish(out)
+
+    @staticmethod
+    def _append(ws, rows, option="RAW"):
+        perf.count("bytes_written", perf.rows_bytes(rows))
+        ws.append_rows(rows, value_input_option=option, table_range="A1")
+
+    def remove(self, rows):
+        """ลบแถว (เลขแถวในชีต) ออก"""
+        rows = [int(r) for r in rows]
+        with self._exclusive():
+            out = self._renumber(self.cache.df, rows)
+            if not self._delta_ok(): return self.save(out)
+            self._delete_rows(self._sheet(), rows)
+            self._publish(out)
+
+    # --- Ledger -------------------------------------------------------------
+    def _write_ledger(self, out, new, drop=(), changed=None):
+        # เรียกขณะถือ _exclusive: out = Ledger หลังแก้, new = แถวที่เพิ่ม, drop = เลขแถวเดิมที่ลบ
+        # changed = แถวที่แก้ค่าในที่ (index = เลขแถวเดิม เขียนก่อนลบ เลขแถวยังไม่เลื่อน)
+        c = self.cache
+        if self._delta_ok(LEDGER):
+            if changed is not None and len(changed):
+                data = [{"range": self._range(r, LEDGER_COLS), "values": [self._cells(changed, r, LEDGER_COLS)]} for r in changed.index]
+                perf.count("bytes_written", perf.rows_bytes(d['values'][0] for d in data))
+                self._sheet(LEDGER).batch_update(data, value_input_option="RAW")
+            self._delete_rows(self._sheet(LEDGER), drop)
+            if len(new):
+                self._append(self._sheet(LEDGER), [self._cells(new, r, LEDGER_COLS) for r in new.index])
+        else:
+            out = self._overwrite(LEDGER, out, LEDGER_COLS)
+        c.ledger = out
+        self._bump()
+
+    def _push_events(self, events):
+        """(WriteBehind) ต่อท้าย Ledger: ต้นทุนคงที่ ไม่ขึ้นกับความยาวประวัติ"""
+        c = self.cache
+        with c.lock: delta = self._delta_ok(LEDGER)
+        if delta:
+            self._append(self._sheet(LEDGER), [[e[k] for k in LEDGER_COLS] for e in events])
+            return
+        with c.lock:
+            # หัวตาราง Ledger ไม่ตรง: อ่านชีตล่าสุดแล้วต่อ event ของเราที่ยังไม่มี (รวมที่เข้าคิวระหว่างนี้) ก่อนเขียนทั้งชีต
+            cur = self._read_ledger(pd.DataFrame())
+            queued, self.writer.events = self.writer.events, []
+            self.writer.grown.update((e['Room'], e['GroupName']) for e in queued)
+            new = pd.DataFrame(events + queued, columns=LEDGER_COLS)
+            out = pd.concat([cur[LEDGER_COLS], new[~new['EventId'].isin(cur['EventId'])]], ignore_index=True)
+            out['Amount'] = out['Amount'].astype(int)
+            c.ledger = self._overwrite(LEDGER, self._with_balance(out), LEDGER_COLS)
+            c.pending = []
+            self._bump()
+
+    def _replace_events(self, room, group, events):
+        """แทนที่ event ทั้งหมดของกลุ่ม (Power Editor / ลบกลุ่ม)"""
+        with self._exclusive():
+            led = self._ledger()
+            drop = [int(r) for r in led.index[(led['Room'] == room) & (led['GroupName'] == group)]]
+            keep = self._renumber(led, drop)
+            start = (int(keep.index.max()) if len(keep) else 1) + 1
+            new = pd.DataFrame(events, columns=LEDGER_COLS, index=pd.RangeIndex(start, start + len(events)))
+            out = pd.concat([keep, new]) if len(new) else keep
+            out['Amount'] = out['Amount'].astype(int)
+            self._write_ledger(self._with_balance(out), new, drop)
+
+    def _archive(self, rows):
+        """ต่อท้าย event ที่ถูกพับลงชีต ARCHIVE (ยังไม่มีชีตก็สร้าง)"""
+        if not len(rows): return
+        ws = self._sheet(ARCHIVE)
+        if ws is not None:
+            self._append(ws, [self._cells(rows, r, LEDGER_COLS) for r in rows.index])
+            return
+        try: old = self._get(ARCHIVE)
+        except Exception as e:
+            if not _not_found(e): raise # อ่านไม่สำเร็จชั่วคราว: ห้ามเขียนทับ archive เดิม
+            old = pd.DataFrame(columns=LEDGER_COLS)
+        self._overwrite(ARCHIVE, pd.concat([old, rows[LEDGER_COLS]]), LEDGER_COLS)
+        self.cache.ws.pop(ARCHIVE, None) # ชีตอาจเพิ่งถูกสร้าง ครั้งหน้าลองเขียนรายแถวใหม่
+
+    def compact(self, room, groups=None, before=None, keep=COMPACT_KEEP):
+        """พับ event เก่าของกลุ่มในห้อง (ทุกกลุ่มถ้าไม่ระบุ) เป็น checkpoint คืนจำนวนแถวที่พับ
+
+        XP, Balance และสถิติ badge ไม่เปลี่ยน แถวเดิมย้ายไปชีต ARCHIVE ก่อนลบออกจาก Ledger
+        """
+        with self._exclusive():
+            led = self._ledger()
+            mask = led['Room'] == room
+            if groups is not None: mask &= led['GroupName'].isin(groups)
+            return self._compact(mask, before, keep)
+
+    def _compact(self, mask, before, keep):
+        """(ถือ _exclusive) พับทุกกลุ่มในแถว mask ของ Ledger แล้วเขียน archive + Ledger อย่างละครั้ง"""
+        led = self._ledger()
+        folds = []
+        for _, ev in led[mask].sort_values('Ts', kind='stable').groupby(['Room', 'GroupName'], sort=False):
+            out = self._fold(ev, before, keep)
+            if out is not None: folds.append((ev.index[:out[1]], *out))
+        if not folds: return 0
+        self._archive(pd.concat([old for *_, old in folds]))
+        # checkpoint แทนที่แถวที่พับแถวสุดท้าย (ตามเวลา) จึงยังเรียงก่อน event ที่เหลือ แถวที่พับอื่นลบทิ้ง
+        out = led.copy()
+        last = [int(rows[-1]) for rows, *_ in folds]
+        out.loc[last, LEDGER_COLS] = pd.DataFrame([ck for _, ck, *_ in folds], index=last)[LEDGER_COLS]
+        out['Amount'] = out['Amount'].astype(int)
+        changed = out.loc[last]
+        drop = [int(r) for rows, *_ in folds for r in rows[:-1]]
+        self._write_ledger(self._with_balance(self._renumber(out, drop)), [], drop, changed)
+        return sum(n for _, _, n, _ in folds)
+
+    def _compact_due(self, keys):
+        """(WriteBehind) บีบอัดกลุ่มใน keys ที่ event ใน Ledger เกิน COMPACT_THRESHOLD แถว (ทุกกลุ่มเขียนรวมครั้งเดียว)"""
+        with self.cache.lock:
+            led = self._ledger()
+            size = led.groupby(['Room', 'GroupName'], sort=False).size()
+            due = [k for k in keys if size.get(k, 0) > COMPACT_THRESHOLD]
+        if not due: return
+        with self._exclusive():
+            led = self._ledger()
+            self._compact(pd.MultiIndex.from_frame(led[['Room', 'GroupName']]).isin(due), None, COMPACT_KEEP)
+
+    def update_score(self, room, groups, amount, reason, engine):
+        """Batch Update: Handle multiple groups at once
+
+        แก้ snapshot (XP + Ledger) แล้วคืนทันที การเขียนชีตไปทำใน WriteBehind
+        """
+        if isinstance(groups, str): groups = [groups] # Convert single to list
+        
+        c = self.cache
+        ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        amount = int(amount)
+        with c.lock:
+            rows = self.rows(room, groups)
+            if not rows: return False, 0
+            df = c.df
+            grps = list(df.loc[rows, 'GroupName'])
+            # สถิติ badge อัปเดตทีละกลุ่มแบบ O(1) (balance = XP ปัจจุบัน)
+            stats = [engine.step(dict(c.stats.get((room, g), engine.new_stats()), balance=int(x)), amount)
+                     for g, x in zip(grps, df.loc[rows, 'XP'])]
+            c.stats.update(zip([(room, g) for g in grps], stats))
+            # อัปเดตทุกกลุ่มที่เลือกในครั้งเดียว
+            total = [s['balance'] for s in stats]
+            df.loc[rows, 'XP'] = total
+            df.loc[rows, 'LastUpdated'] = datetime.now().strftime("%Y-%m-%d %H:%M")
+            df.loc[rows, 'Badges'] = [json.dumps(engine.evaluate(s), ensure_ascii=False) for s in stats]
+            events = [{
+                "EventId": str(uuid.uuid4())[:8], "Room": room, "GroupName": grp,
+                "Ts": ts, "Reason": reason, "Amount": amount, "Balance": int(x)
+            } for grp, x in zip(grps, total)]
+            # ไม่ต่อเข้า ledger ทั้งก้อนทุกคลิก: พักไว้ใน pending + appended ของห้อง (RoomModel ของห้องนี้ต่อเพิ่มจากตรงนี้)
+            led = c.ledger
+            start = c.pending[-1][0] + 1 if c.pending else (int(led.index.max()) if len(led) else 1) + 1
+            log = c.appended.setdefault(room, [])
+            for r, e in enumerate(events, start):
+                c.pending.append((r, e))
+                log.append((r, e))
+            self._bump(appended=len(log) <= APPEND_LOG_MAX) # log ยาวเกิน: เริ่ม epoch ใหม่ (สร้างโมเดลใหม่ครั้งเดียว)
+            self.writer.push(self, {(room, g): amount for g in grps}, events)
+        return True, len(events)
+
+    def create(self, room, name, mem):
+        with self._exclusive(reload=True):
+            if not self.rows(room, [name]):
+                self.append({
+                    "Room": room, "GroupName": name, "XP": 0, "Members": mem,
+                    "LastUpdated": datetime.now().strftime("%Y-%m-%d %H:%M"),
+                    "Badges": "[]", "Rev": 0
+                })
+                return True
+        return False
+
+    def delete(self, room, name):
+        with self._exclusive(reload=True):
+            self._replace_events(room, name, [])
+            self.remove(self.rows(room, [name]))
+            self.cache.stats.pop((room, name), None)
+
+    def power_edit(self, room, name, new_hist_df, engine):
+        if not self.rows(room, [name]): return False
+        events, total, stats = self._edited(room, name, new_hist_df)
+        with self._exclusive(reload=True):
+            if not self.rows(room, [name]): return False
+            self._replace_events(room, name, events)
+            i = self.rows(room, [name])[0]
+            self.cache.stats[(room, name)] = stats
+            self.cache.df.at[i, 'XP'] = total
+            self.cache.df.at[i, 'Badges'] = json.dumps(engine.evaluate(stats), ensure_ascii=False)
+            self.writer.push(self, {(room, name): None}, [])
+        return True
+
+    def badges(self, room, engine):
+        """badge ของทุกกลุ่มในห้องจากสถิติ (ไม่ต้องแปลง JSON) index = GroupName"""
+        c = self.cache
+        with c.lock:
+            df = c.df[c.df['Room'] == room]
+            stats = pd.DataFrame([c.stats.get((room, g), engine.new_stats()) for g in df['GroupName']],
+                                 index=df['GroupName'], columns=list(STATS))
+        stats['balance'] = df['XP'].to_numpy()
+        return engine.evaluate_frame(stats)
+
+# ------------------------------------------------------------------------------
+# SQLite (เครื่องเดียว ไม่ต้องต่อเน็ต ใช้แทนชีตตอนพัฒนา/ทดสอบโหลด)
+# ------------------------------------------------------------------------------
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS groups (
+    Room TEXT NOT NULL, GroupName TEXT NOT NULL, XP INTEGER NOT NULL DEFAULT 0,
+    Members TEXT, LastUpdated TEXT, Badges TEXT NOT NULL DEFAULT '[]', Rev INTEGER NOT NULL DEFAULT 0,
+    %s,
+    PRIMARY KEY (Room, GroupName)
+);
+CREATE TABLE IF NOT EXISTS ledger (
+    Seq INTEGER PRIMARY KEY, EventId TEXT NOT NULL, Room TEXT NOT NULL, GroupName TEXT NOT NULL,
+    Ts TEXT NOT NULL, Reason TEXT NOT NULL DEFAULT '', Amount INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ledger_group_ts ON ledger (Room, GroupName, Ts);
+CREATE INDEX IF NOT EXISTS ledger_ts ON ledger (Ts);
+CREATE TABLE IF NOT EXISTS ledger_archive (
+    Seq INTEGER PRIMARY KEY, EventId TEXT, Room TEXT NOT NULL, GroupName TEXT NOT NULL,
+    Ts TEXT NOT NULL, Reason TEXT, Amount INTEGER NOT NULL
+);
+""" % ", ".join(f"{s} INTEGER NOT NULL DEFAULT 0" for s in STATS) # สถิติ badge เก็บคู่กับ XP
+
+class SQLiteDB:
+    def __init__(self, path):
+        # autocommit: transaction เปิดเองด้วย BEGIN IMMEDIATE (กันหลาย process เขียนแทรกกัน)
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SQLITE_SCHEMA)
+        self._migrate()
+        self.lock = threading.Lock()
+        self.version = 0
+        self.data_version = None
+        self.df = None # fetch() ล่าสุด ใช้ซ้ำจนกว่า version จะเปลี่ยน
+
+    def _migrate(self):
+        # ไฟล์ที่สร้างก่อนมีคอลัมน์สถิติ: เพิ่มคอลัมน์แล้วคิดค่าจาก ledger ครั้งเดียว
+        have = {r[1] for r in self.conn.execute("PRAGMA table_info(groups)")}
+        missing = [s for s in STATS if s not in have]
+        if not missing: return
+        for s in missing: self.conn.execute(f"ALTER TABLE groups ADD COLUMN {s} INTEGER NOT NULL DEFAULT 0")
+        self.restat(self.conn)
+
+    @staticmethod
+    def restat(conn):
+        """คิดคอลัมน์สถิติ badge ของทุกกลุ่มใหม่จาก ledger (กลุ่มที่ไม่มี event คงค่า 0)"""
+        ev = pd.DataFrame(conn.execute("SELECT EventId, Room, GroupName, Amount FROM ledger ORDER BY Ts, Seq").fetchall(),
+                          columns=['EventId', 'Room', 'GroupName', 'Amount'])
+        stats = BadgeEngine.stats_from_events(ev)
+        conn.executemany(f"UPDATE groups SET {', '.join(f'{s} = ?' for s in STATS)} WHERE Room = ? AND GroupName = ?",
+                         [(*map(int, v), *k) for k, v in zip(stats.index, stats.to_numpy())])
+
+@st.cache_resource
+def shared_sqlite(path):
+    return SQLiteDB(path)
+
+class SQLiteStore(Store):
+    """SQLite ไฟล์เดียว: ตาราง groups (PK Room, GroupName) + ledger (index ตามกลุ่ม/เวลา)"""
+    def __init__(self, path=None):
+        self.source = path or SQLITE_PATH
+        self.db = shared_sqlite(self.source)
+        self.conn = self.db.conn
+
+    @property
+    def version(self):
+        # data_version เปลี่ยนเมื่อ connection อื่น (อีก process) commit
+        db = self.db
+        with db.lock:
+            dv = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            if dv != db.data_version:
+                db.data_version = dv
+                db.version += 1
+            return db.version
+
+    @contextmanager
+    def _tx(self):
+        with self.db.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+            self.db.version += 1
+
+    def _query(self, sql, args, cols):
+        # cursor ตรง ๆ เร็วกว่า pd.read_sql_query มากเมื่อผลลัพธ์เล็ก
+        with self.db.lock:
+            rows = self.conn.execute(sql, args).fetchall()
+        return pd.DataFrame(rows, columns=cols)
+
+    def fetch(self):
+        db, v = self.db, self.version
+        df = db.df
+        if df is None or df.attrs.get('version') != v:
+            with perf.span("fetch"): df = self._query(f"SELECT {', '.join(COLS)} FROM groups ORDER BY rowid", (), COLS)
+            perf.count("bytes_read", perf.frame_bytes(df))
+            df.index = pd.RangeIndex(2, len(df) + 2) # เหมือน Sheet1 (แถว 1 คือหัวตาราง)
+            df.attrs['version'] = v
+            db.df = df
+        out = df.copy()
+        out.attrs['version'] = v
+        return out
+
+    def save(self, df):
+        rows = df.reindex(columns=COLS).fillna({'XP': 0, 'Rev': 0, 'Badges': '[]'})
+        perf.count("bytes_written", perf.frame_bytes(rows))
+        with self._tx() as c, perf.span("save"):
+            c.execute("DELETE FROM groups")
+            c.executemany(f"INSERT INTO groups ({', '.join(COLS)}) VALUES ({', '.join('?' * len(COLS))})",
+                          [tuple(r) for r in rows.itertuples(index=False)])
+            # df มีแค่ COLS: สถิติ badge ของแถวที่ใส่ใหม่คิดจาก ledger ไม่งั้น update_score ครั้งถัดไปจะเริ่มจาก 0
+            SQLiteDB.restat(c)
+
+    def reset(self):
+        # สถิติ badge อยู่ในแถวของ groups จึงหายไปด้วย (ledger_archive ไม่ถูกแตะ)
+        with self._tx() as c, perf.span("save"):
+            c.execute("DELETE FROM groups")
+            c.execute("DELETE FROM ledger")
+
+    def events(self, room, group=None):
+        if room is None: where, args = "1", []
+        else: where, args = "Room = ?", [room]
+        if room is not None and group is not None:
+            where += " AND GroupName = ?"
+            args.append(group)
+        return self._query(
+            f"SELECT {', '.join(LEDGER_COLS)}, SUM(Amount) OVER (PARTITION BY Room, GroupName ORDER BY Ts, Seq) AS Balance "
+            f"FROM ledger WHERE {where} ORDER BY Ts DESC, Seq DESC", args, LEDGER_COLS + ['Balance'])
+
+    def update_score(self, room, groups, amount, reason, engine):
+        """Batch Update: Handle multiple groups at once (อ่าน-บวก-เขียนใน transaction เดียว)"""
+        if isinstance(groups, str): groups = [groups] # Convert single to list
+        
+        amount = int(amount)
+        ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        now = datetime.now().strftime("%Y-%m-%d %H:%M")
+        with self._tx() as c:
+            cur = c.execute(f"SELECT GroupName, XP, {', '.join(STATS)} FROM groups WHERE Room = ? AND GroupName IN ({', '.join('?' * len(groups))})",
+                            [room, *groups]).fetchall()
+            # สถิติ badge อัปเดตทีละ event แบบ O(1) (balance = XP ปัจจุบัน)
+            rows = [(g, engine.step(dict(zip(STATS, v), balance=xp), amount)) for g, xp, *v in cur]
+            c.executemany(f"UPDATE groups SET XP = ?, Badges = ?, LastUpdated = ?, Rev = Rev + 1, {', '.join(f'{s} = ?' for s in STATS)} "
+                          "WHERE Room = ? AND GroupName = ?",
+                          [(s['balance'], json.dumps(engine.evaluate(s), ensure_ascii=False), now, *(s[k] for k in STATS), room, g) for g, s in rows])
+            c.executemany("INSERT INTO ledger (EventId, Room, GroupName, Ts, Reason, Amount) VALUES (?, ?, ?, ?, ?, ?)",
+                          [(str(uuid.uuid4())[:8], room, g, ts, reason, amount) for g, _ in rows])
+            # นับจาก index (Room, GroupName, Ts) เฉพาะกลุ่มที่เพิ่งได้คะแนน
+            due = [g for g, n in c.execute(f"SELECT GroupName, COUNT(*) FROM ledger WHERE Room = ? AND GroupName IN ({', '.join('?' * len(rows))}) "
+                                           "GROUP BY GroupName", [room, *(g for g, _ in rows)]) if n > COMPACT_THRESHOLD]
+        if due: self.compact(room, due)
+        return bool(rows), len(rows)
+
+    def create(self, room, name, mem):
+        with self._tx() as c:
+            n = c.execute("INSERT OR IGNORE INTO groups (Room, GroupName, XP, Members, LastUpdated, Badges, Rev) VALUES (?, ?, 0, ?, ?, '[]', 0)",
+                          (room, name, mem, datetime.now().strftime("%Y-%m-%d %H:%M"))).rowcount
+        return n == 1
+
+    def delete(self, room, name):
+        with self._tx() as c:
+            c.execute("DELETE FROM ledger WHERE Room = ? AND GroupName = ?", (room, name))
+            c.execute("DELETE FROM groups WHERE Room = ? AND GroupName = ?", (room, name))
+
+    def power_edit(self, room, name, new_hist_df, engine):
+        events, total, stats = self._edited(room, name, new_hist_df)
+        with self._tx() as c:
+            n = c.execute(f"UPDATE groups SET XP = ?, Badges = ?, Rev = Rev + 1, {', '.join(f'{s} = ?' for s in STATS)} WHERE Room = ? AND GroupName = ?",
+                          (total, json.dumps(engine.evaluate(stats), ensure_ascii=False), *(stats[k] for k in STATS), room, name)).rowcount
+            if n:
+                c.execute("DELETE FROM ledger WHERE Room = ? AND GroupName = ?", (room, name))
+                c.executemany("INSERT INTO ledger (EventId, Room, GroupName, Ts, Reason, Amount) VALUES (?, ?, ?, ?, ?, ?)",
+                              [tuple(e[k] for k in LEDGER_COLS) for e in events])
+        return n > 0
+
+    def compact(self, room, groups=None, before=None, keep=COMPACT_KEEP):
+        """พับ event เก่าเป็น checkpoint (ใช้ Seq ของแถวสุดท้ายที่พับ จึงยังเรียงก่อนแถวที่เหลือ) แถวเดิมย้ายไป ledger_archive"""
+        cols = ['Seq', *LEDGER_COLS]
+        folded = 0
+        with self._tx() as c:
+            if groups is None: groups = [g for g, in c.execute("SELECT GroupName FROM groups WHERE Room = ?", (room,))]
+            for g in groups:
+                ev = pd.DataFrame(c.execute(f"SELECT {', '.join(cols)} FROM ledger WHERE Room = ? AND GroupName = ? ORDER BY Ts, Seq",
+                                            (room, g)).fetchall(), columns=cols)
+                out = self._fold(ev, before, keep)
+                if out is None: continue
+                ck, n, old = out
+                c.executemany(f"INSERT INTO ledger_archive ({', '.join(LEDGER_COLS)}) VALUES ({', '.join('?' * len(LEDGER_COLS))})",
+                              [tuple(r) for r in old[LEDGER_COLS].itertuples(index=False)])
+                seq = ev['Seq'].iloc[:n].tolist()
+                c.executemany("DELETE FROM ledger WHERE Seq = ?", [(int(q),) for q in seq])
+                c.execute(f"INSERT INTO ledger (Seq, {', '.join(LEDGER_COLS)}) VALUES (?, {', '.join('?' * len(LEDGER_COLS))})",
+                          (int(seq[-1]), *(ck[k] for k in LEDGER_COLS)))
+                folded += n
+        return folded
+
+    def badges(self, room, engine):
+        """badge ของทุกกลุ่มในห้องจากคอลัมน์สถิติ (ไม่ต้องแปลง JSON) index = GroupName"""
+        stats = self._query(f"SELECT GroupName, XP, {', '.join(STATS)} FROM groups WHERE Room = ?", (room,),
+                            ['GroupName', 'XP', *STATS]).set_index('GroupName')
+        stats['balance'] = stats.pop('XP')
+        return engine.evaluate_frame(stats)
+
+BACKENDS = {"gsheets": SheetsStore, "sqlite": SQLiteStore}
+
+def open_store(backend=None):
+    """storage ตามค่า STORAGE_BACKEND (หรือที่ระบุ)"""
+    return BACKENDS[backend or STORAGE_BACKEND]()
@@ -0,0 +1,26 @@
+# ==============================================================================
+# pytest: ใช้โมดูลจากรากของ repo (app.py ไม่ใช่แพ็กเกจ) + ชีตจำลองจาก bench
+# ==============================================================================
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.data import generate, room_name
+from bench.fake_gsheets import FakeSheets
+from storage import LEDGER, SHEET
+
+@pytest.fixture
+def book():
+    """ชีตจำลอง 1 ห้อง 4 กลุ่ม กลุ่มละ 20 event (XP ใน Sheet1 ตรงกับ Ledger)"""
+    sheet, led = generate(rooms=1, groups=4, events=20, seed=7)
+    fs = FakeSheets()
+    fs.load(SHEET, sheet)
+    fs.load(LEDGER, led)
+    return fs
+
+@pytest.fixture
+def room():
+    return room_name(0)
@@ -0,0 +1,63 @@
+import pandas as pd
+import pytest
+
+from bench.data import generate
+from gamification import BadgeEngine, RankSystem
+from storage import Store
+
+@pytest.fixture(scope="module")
+def rs():
+    return RankSystem.load()
+
+@pytest.mark.parametrize("xp, label", [
+    ([10**6, 10**7], "MAX LEVEL"),
+    ([-5, -1], "🔴 Warning: Negative Score"),
+])
+def test_progress_for_without_mid_tier(rs, xp, label):
+    out = rs.progress_for(xp)
+    assert list(out['label']) == [label] * len(xp)
+    assert list(out['pct']) == [1.0 if label == "MAX LEVEL" else 0.0] * len(xp)
+
+def test_progress_for_empty(rs):
+    out = rs.progress_for(pd.Series([], dtype=int))
+    assert out.empty and list(out.columns) == ['pct', 'label']
+
+def test_progress_for_matches_get_progress(rs):
+    xp = [-20, 0, 50, 350, 10**6]
+    out = rs.progress_for(xp)
+    assert [tuple(r) for r in out.itertuples(index=False)] == [rs.get_progress(x) for x in xp]
+
+def _stepped(amounts):
+    s = BadgeEngine.new_stats()
+    for a in amounts: s = BadgeEngine.step(s, a)
+    return s
+
+def test_stats_from_events_matches_step():
+    _, led = generate(rooms=2, groups=3, events=60, seed=3)
+    stats = BadgeEngine.stats_from_events(led)
+    for key, ev in led.groupby(['Room', 'GroupName']):
+        assert stats.loc[key].to_dict() == _stepped(ev['Amount'])
+
+@pytest.mark.parametrize("keep", [0, 1, 5, 30])
+def test_stats_from_events_after_checkpoint(keep):
+    # แต่ละกลุ่มพับ event เก่าเป็น checkpoint (ซ้ำสองรอบ = checkpoint ที่ถูกพับอีกที) สถิติต้องเท่าเดิม
+    _, led = generate(rooms=1, groups=4, events=60, seed=11)
+    for key, ev in led.groupby(['Room', 'GroupName']):
+        want = _stepped(ev['Amount'])
+        for _ in range(2):
+            folded = Store._fold(ev, keep=keep)
+            if folded is None: break
+            ck, n, _ = folded
+            ev = pd.concat([pd.DataFrame([ck]), ev.iloc[n:]], ignore_index=True)
+            got = BadgeEngine.stats_from_events(ev).iloc[0].to_dict()
+            assert got == want
+            keep = max(keep - 1, 0)
+
+def test_evaluate_frame_matches_evaluate():
+    _, led = generate(rooms=1, groups=6, events=40, seed=5)
+    be = BadgeEngine()
+    stats = BadgeEngine.stats_from_events(led)
+    frame = be.evaluate_frame(stats)
+    for key, row in stats.iterrows():
+        assert frame[key] == be.evaluate(row.to_dict())
+    assert be.evaluate_frame(stats.iloc[:0]).empty
@@ -0,0 +1,37 @@
+import io
+import zipfile
+
+from PIL import Image
+
+import leaderboard_image
+from bench.data import generate, room_name
+from gamification import RankSystem
+
+def test_export_renders_rooms_in_worker_processes():
+    sheet, _ = generate(rooms=3, groups=4, events=1, seed=2)
+    leaderboard_image._png_cache.clear()
+    data = leaderboard_image.export_leaderboards(sheet, RankSystem.load(), max_workers=2)
+    zf = zipfile.ZipFile(io.BytesIO(data))
+    assert sorted(zf.namelist()) == sorted(f"Leaderboard_{room_name(i).replace('/', '-')}.png" for i in range(3))
+    for name in zf.namelist():
+        assert Image.open(zf.open(name)).format == "PNG"
+
+def test_export_writes_one_entry_per_page():
+    sheet, _ = generate(rooms=2, groups=5, events=1, seed=2)
+    leaderboard_image._png_cache.clear()
+    data = leaderboard_image.export_leaderboards(sheet, RankSystem.load(), max_workers=1, per_page=2, fmt="JPEG")
+    zf = zipfile.ZipFile(io.BytesIO(data))
+    safe = [room_name(i).replace('/', '-') for i in range(2)]
+    assert sorted(zf.namelist()) == sorted(f"Leaderboard_{s}_{p:02d}.jpg" for s in safe for p in (1, 2, 3))
+    heights = [Image.open(zf.open(f"Leaderboard_{safe[0]}_{p:02d}.jpg")).height for p in (1, 2, 3)]
+    assert heights[0] == heights[1] > heights[2]
+
+def test_single_image_format_and_budget():
+    sheet, _ = generate(rooms=1, groups=4, events=1, seed=2)
+    room_df = sheet[['GroupName', 'Members', 'XP']]
+    rs = RankSystem.load()
+    leaderboard_image._png_cache.clear()
+    full = leaderboard_image.leaderboard_file(room_name(0), room_df, rs, "WEBP")
+    small = leaderboard_image.leaderboard_file(room_name(0), room_df, rs, "WEBP", max_bytes=len(full) // 2)
+    assert Image.open(io.BytesIO(small)).format == "WEBP"
+    assert len(small) <= len(full) // 2
@@ -0,0 +1,219 @@
+import pandas as pd
+import pytest
+
+from gamification import BadgeEngine
+from storage import ARCHIVE, LEDGER, SHEET, RoomModel, SheetsStore
+
+be = BadgeEngine()
+
+def open_store(fs):
+    db = SheetsStore(conn=fs)
+    db.fetch()
+    return db
+
+def sheet_xp(fs):
+    df = fs.read(worksheet=SHEET)
+    return dict(zip(df['GroupName'], df['XP']))
+
+def ledger_rows(fs):
+    return len(fs.grid[LEDGER]) - 1
+
+# --- compare-and-swap ระหว่างสอง instance ----------------------------------------
+def test_two_stores_award_same_row(book, room):
+    a, b = open_store(book), open_store(book)
+    start = sheet_xp(book)['G01']
+    a.update_score(room, ['G01'], 100, "a", be)
+    a.writer.drain()
+    b.update_score(room, ['G01'], 20, "b", be) # snapshot ของ b ยังไม่เห็นคะแนนของ a
+    b.writer.drain()
+    assert sheet_xp(book)['G01'] == start + 120
+    assert b.fetch().set_index('GroupName').at['G01', 'XP'] == start + 120
+    a.update_score(room, ['G01'], 5, "a", be) # a เห็น Rev ไม่ตรงอีกรอบ
+    a.writer.drain()
+    assert sheet_xp(book)['G01'] == start + 125
+
+def test_other_rows_untouched(book, room):
+    a, b = open_store(book), open_store(book)
+    before = sheet_xp(book)
+    a.update_score(room, ['G01'], 15, "a", be)
+    b.update_score(room, ['G02'], -20, "b", be)
+    a.writer.drain()
+    b.writer.drain()
+    assert sheet_xp(book) == {**before, 'G01': before['G01'] + 15, 'G02': before['G02'] - 20}
+
+def test_row_shift_after_other_instance_delete(book, room):
+    a, b = open_store(book), open_store(book)
+    before = sheet_xp(book)
+    b.delete(room, 'G01') # แถวของ G02..G04 เลื่อนขึ้นในชีต แต่ snapshot ของ a ยังเป็นเลขเดิม
+    a.update_score(room, ['G03'], 100, "a", be)
+    a.writer.drain()
+    del before['G01']
+    assert sheet_xp(book) == {**before, 'G03': before['G03'] + 100}
+
+def test_row_shift_after_other_instance_create(book, room):
+    a, b = open_store(book), open_store(book)
+    a.delete(room, 'G02')
+    before = sheet_xp(book)
+    b.create(room, 'G09', "x") # snapshot ของ b ยังมี G02 อยู่
+    b.update_score(room, ['G04', 'G09'], 20, "b", be)
+    b.writer.drain()
+    a.update_score(room, ['G04'], 5, "a", be)
+    a.writer.drain()
+    assert sheet_xp(book) == {**before, 'G04': before['G04'] + 25, 'G09': 20}
+
+# --- เขียนรายแถว: worksheet ล้มชั่วคราว / หัวตารางไม่ตรง -------------------------
+def test_worksheet_lookup_retried(book, room, monkeypatch):
+    db = open_store(book)
+    start = sheet_xp(book)['G01']
+    real, calls = book.client._select_worksheet, []
+    def flaky(**kw):
+        calls.append(kw['worksheet'])
+        if len(calls) == 1: raise ConnectionError("timeout")
+        return real(**kw)
+    monkeypatch.setattr(book.client, "_select_worksheet", flaky)
+    db.cache.ws.clear()
+    db.update_score(room, ['G01'], 20, "x", be)
+    with pytest.raises(RuntimeError):
+        db.writer.drain()
+    assert db.status()[0] == 1 # ยังอยู่ในคิว ไม่ได้เขียนทับทั้งชีต
+    db.writer.drain()
+    assert sheet_xp(book)['G01'] == start + 20
+    assert book.calls.get('update', 0) == 0
+
+def test_header_mismatch_merges_other_instance(book, room):
+    a, b = open_store(book), open_store(book)
+    start = sheet_xp(book)['G01']
+    b.update_score(room, ['G01'], 100, "b", be)
+    b.writer.drain()
+    a.cache.header_ok[SHEET] = a.cache.header_ok[LEDGER] = False # เหมือนชีตเดิมที่ต้องเขียนทั้งชีต
+    a.update_score(room, ['G01'], 20, "a", be)
+    a.writer.drain()
+    assert sheet_xp(book)['G01'] == start + 120
+    assert ledger_rows(book) == 80 + 2
+
+# --- Ledger ไม่หายเมื่ออ่านไม่สำเร็จ / Repair ------------------------------------
+def fail_reads(fs, monkeypatch, worksheet, times=1):
+    """ให้อ่าน worksheet ล้ม times ครั้ง (เช่น 429 quota) แล้วกลับมาอ่านได้"""
+    real, left = fs.read, [times]
+    def read(worksheet=SHEET, _fail=worksheet, **kw):
+        if worksheet == _fail and left[0] > 0:
+            left[0] -= 1
+            raise ConnectionError("429 quota exceeded")
+        return real(worksheet=worksheet, **kw)
+    monkeypatch.setattr(fs, "read", read)
+
+def test_ledger_read_error_keeps_ledger(book, monkeypatch):
+    rows = ledger_rows(book)
+    fail_reads(book, monkeypatch, LEDGER)
+    db = SheetsStore(conn=book)
+    assert db.fetch().empty # ยังไม่เคยโหลด: ไม่มีอะไรให้แสดง
+    assert db.status()[1]
+    assert ledger_rows(book) == rows
+    db.cache.loaded_at = 0 # รอบถัดไปอ่านได้
+    assert len(db.fetch()) == 4 and db.status()[1] is None
+
+def test_missing_ledger_is_created(book):
+    del book.grid[LEDGER]
+    db = open_store(book)
+    assert ledger_rows(book) == 0
+    assert db.events(None).empty
+
+def test_reset_clears_ledger_and_stats(book, room):
+    db = open_store(book)
+    db.reset()
+    assert ledger_rows(book) == 0 and db.fetch().empty and not db.cache.stats
+    db.create(room, 'G01', "x")
+    assert db.room(room).groups['G01'].badges == ()
+    assert db.history(room, 'G01').empty
+
+# --- ให้คะแนน: พัก event ไว้ต่อท้าย ไม่ต่อ Ledger ทั้งก้อน / ต่อ RoomModel เดิม ----------
+def rebuilt(db, room):
+    df = db.fetch()
+    return RoomModel(room, df[df['Room'] == room], db.events(room).iloc[::-1], db.badges(room, be))
+
+def test_award_extends_room_model(book, room):
+    db = open_store(book)
+    db.create("ม.9/9", 'X', "x")
+    m0 = db.room(room)
+    led = db.cache.ledger
+    db.update_score(room, ['G01'], 20, "a", be)
+    assert db.cache.ledger is led and len(db.cache.pending) == 1
+    m1 = db.room(room)
+    assert m1 is not m0 and m1.groups['G02'] is m0.groups['G02']
+    db.update_score(room, ['G01', 'G03'], 100, "b", be)
+    db.update_score("ม.9/9", ['X'], 5, "c", be)
+    assert db.room(room).groups['G02'] is m0.groups['G02']
+    m2, fresh = db.room(room), rebuilt(db, room)
+    for g, rec in fresh.groups.items():
+        got = m2.groups[g]
+        assert (got.xp, got.badges) == (rec.xp, rec.badges)
+        pd.testing.assert_frame_equal(got.history(), rec.history())
+    pd.testing.assert_frame_equal(m2.timeline(), fresh.timeline())
+    assert db.events(room)['Reason'].head(3).tolist() == ["b", "b", "a"]
+
+def test_buffered_rows_match_sheet(book, room):
+    db = open_store(book)
+    db.update_score(room, ['G01', 'G02'], 20, "a", be)
+    db.update_score(room, ['G02'], -100, "b", be)
+    db.writer.drain()
+    hist = db.history(room, 'G02')
+    db.power_edit(room, 'G02', hist.iloc[1:], be) # ลบ event ล่าสุดของ G02 ตามเลขแถว
+    db.writer.drain()
+    got = book.read(worksheet=LEDGER)
+    assert got['EventId'].tolist() == db.events(None).sort_index()['EventId'].tolist()
+    assert "b" not in set(db.events(room, 'G02')['Reason'])
+    assert db.room(room).groups['G02'].xp == rebuilt(db, room).groups['G02'].xp
+
+# --- snapshot เดิมยังใช้ได้เมื่ออ่าน/เขียนชีตไม่สำเร็จ ---------------------------
+def test_expired_snapshot_kept_on_read_error(book, monkeypatch):
+    db = open_store(book)
+    rows = ledger_rows(book)
+    fail_reads(book, monkeypatch, LEDGER)
+    db.cache.loaded_at = 0
+    assert len(db.fetch()) == 4
+    assert db.status()[1] and ledger_rows(book) == rows
+
+def test_fetch_keeps_snapshot_when_drain_fails(book, room, monkeypatch):
+    db = open_store(book)
+    db.update_score(room, ['G01'], 100, "x", be)
+    monkeypatch.setattr(book.client, "_select_worksheet", lambda **kw: (_ for _ in ()).throw(ConnectionError("offline")))
+    db.cache.ws.clear()
+    db.cache.loaded_at = 0
+    df = db.fetch()
+    assert len(df) == 4
+    pending, error = db.status()
+    assert pending == 1 and error
+    monkeypatch.undo()
+    db.writer.drain()
+    assert db.status() == (0, None)
+
+# --- บีบอัดประวัติ ---------------------------------------------------------------
+def test_compact_keeps_balance_and_stats(book, room):
+    db = open_store(book)
+    stats = dict(db.cache.stats)
+    xp = sheet_xp(book)
+    folded = db.compact(room, keep=3)
+    assert folded == 4 * 17
+    assert ledger_rows(book) == 4 * 4
+    assert len(book.grid[ARCHIVE]) - 1 == folded
+    fresh = open_store(book) # อ่านจากชีตใหม่ทั้งหมด
+    assert fresh.cache.stats == stats
+    last = fresh.events(room).groupby('GroupName')['Balance'].first()
+    assert last.to_dict() == xp
+
+def test_auto_compaction_folds_all_due_groups(book, room, monkeypatch):
+    import storage
+    monkeypatch.setattr(storage, "COMPACT_THRESHOLD", 10)
+    monkeypatch.setattr(storage, "COMPACT_KEEP", 4)
+    db = open_store(book)
+    stats = dict(db.cache.stats)
+    db._compact_due({(room, g) for g in ('G01', 'G02', 'G03')})
+    fresh = open_store(book)
+    assert fresh.events(room).groupby('GroupName').size().to_dict() == {'G01': 5, 'G02': 5, 'G03': 5, 'G04': 20}
+    assert fresh.cache.stats == stats
+
+def test_renumber():
+    df = pd.DataFrame({'x': range(10)}, index=range(2, 12))
+    out = SheetsStore._renumber(df, [3, 7, 8])
+    assert list(out.index) == list(range(2, 9))
+    assert list(out['x']) == [0, 2, 3, 4, 7, 8, 9]
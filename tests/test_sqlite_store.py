@@ -0,0 +1,76 @@
+import pytest
+
+from gamification import BadgeEngine
+from storage import SQLiteDB, SQLiteStore, Store
+
+be = BadgeEngine()
+ROOM = "ม.1/1"
+
+@pytest.fixture
+def db(tmp_path):
+    db = SQLiteStore(str(tmp_path / "classroom.db"))
+    for g in ('A', 'B'): db.create(ROOM, g, "x")
+    return db
+
+def xp(db):
+    df = db.fetch()
+    return dict(zip(df['GroupName'], df['XP']))
+
+def test_two_connections_award_same_row(db, tmp_path):
+    # อีก process = อีก connection ไปไฟล์เดียวกัน (ไม่ใช้ SQLiteDB ที่แคชไว้ด้วย cache_resource)
+    other = SQLiteStore(str(tmp_path / "classroom.db"))
+    other.db = SQLiteDB(other.source)
+    other.conn = other.db.conn
+    assert xp(db) == xp(other)
+    db.update_score(ROOM, ['A'], 100, "a", be)
+    other.update_score(ROOM, ['A'], 20, "b", be)
+    assert xp(db) == xp(other) == {'A': 120, 'B': 0}
+
+def test_version_changes_on_write(db):
+    v = db.version
+    db.update_score(ROOM, ['B'], 5, "x", be)
+    assert db.version != v and xp(db)['B'] == 5
+
+def test_stats_and_badges_follow_events(db):
+    for a in (100, -100, -20, 100, 15):
+        db.update_score(ROOM, ['A'], a, "x", be)
+    ev = db.events(ROOM, 'A').iloc[::-1]
+    stats = BadgeEngine.stats_from_events(ev).iloc[0].to_dict()
+    assert stats['balance'] == xp(db)['A'] == 95
+    assert list(db.badges(ROOM, be)['A']) == be.evaluate(stats)
+    assert db.room(ROOM).groups['A'].badges == tuple(be.evaluate(stats))
+
+def test_compact_keeps_xp_history_and_badges(db):
+    for i in range(12): db.update_score(ROOM, ['A'], (-1) ** i * 30 + 5, "x", be)
+    before = db.history(ROOM, 'A')
+    badges = list(db.badges(ROOM, be)['A'])
+    assert db.compact(ROOM, keep=4) == 8
+    after = db.history(ROOM, 'A')
+    assert len(after) == 5
+    assert list(after['balance'][:4]) == list(before['balance'][:4])
+    assert list(db.badges(ROOM, be)['A']) == badges
+    assert db.conn.execute("SELECT COUNT(*) FROM ledger_archive").fetchone()[0] == 8
+
+def test_reset_clears_groups_ledger_and_stats(db):
+    db.update_score(ROOM, ['A'], 100, "x", be)
+    db.reset()
+    assert db.fetch().empty and db.events(None).empty
+    db.create(ROOM, 'A', "x")
+    assert xp(db) == {'A': 0}
+    assert list(db.badges(ROOM, be)['A']) == []
+
+def test_save_keeps_badge_stats(db):
+    for a in (100, 100, -20):
+        db.update_score(ROOM, ['A'], a, "x", be)
+    stats = db.badges(ROOM, be)['A']
+    db.save(db.fetch())
+    assert list(db.badges(ROOM, be)['A']) == list(stats)
+    db.update_score(ROOM, ['A'], 100, "x", be) # ต่อจากสถิติเดิม ไม่เริ่มจาก 0
+    ev = db.events(ROOM, 'A').iloc[::-1]
+    assert list(db.badges(ROOM, be)['A']) == be.evaluate(BadgeEngine.stats_from_events(ev).iloc[0].to_dict())
+
+def test_backend_missing_method_fails_on_create():
+    class Partial(Store):
+        def fetch(self): return None
+    with pytest.raises(TypeError):
+        Partial()